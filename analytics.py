@@ -0,0 +1,100 @@
+import time
+import logging
+from datetime import timedelta
+from contextlib import contextmanager
+from dateutil.relativedelta import relativedelta
+
+logger = logging.getLogger('fee_manager')
+
+# Latency budget for an analytics endpoint, in milliseconds
+LATENCY_BUDGET_MS = 500
+
+# (label, lower bound in days, upper bound in days or None). A fee is
+# counted as due from the first day of its billing month.
+AGING_BUCKETS = (
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+
+@contextmanager
+def latency_budget(name, budget_ms=LATENCY_BUDGET_MS):
+    """Time a block and log a warning when it exceeds ``budget_ms``.
+
+    Yields a dict whose ``elapsed_ms`` is filled in when the block exits.
+    """
+    timing = {'elapsed_ms': None}
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        if timing['elapsed_ms'] > budget_ms:
+            logger.warning(f'Analytics {name} took {timing["elapsed_ms"]}ms (budget {budget_ms}ms)')
+
+
+def aging_cutoffs(today):
+    """[(label, oldest_month, newest_month)] billing-month bounds per bucket.
+
+    ``oldest_month`` is None for the open-ended last bucket.
+    """
+    cutoffs = []
+    for label, low, high in AGING_BUCKETS:
+        newest = today - timedelta(days=low)
+        oldest = today - timedelta(days=high) if high is not None else None
+        cutoffs.append((label, oldest, newest))
+    return cutoffs
+
+
+def aging_report(rows):
+    """Fill in every bucket from (label, amount, fees, students) rows"""
+    found = {label: (amount, fees, students) for label, amount, fees, students in rows}
+    buckets = []
+    for label, _, _ in AGING_BUCKETS:
+        amount, fees, students = found.get(label, (0, 0, 0))
+        buckets.append({
+            'bucket': label,
+            'amount': round(amount or 0, 2),
+            'fees': fees,
+            'students': students,
+        })
+    return buckets
+
+
+def month_range(start, end):
+    """First-of-month dates from ``start`` to ``end`` inclusive"""
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month += relativedelta(months=1)
+    return months
+
+
+def collection_trend(rows, start, end):
+    """Month-over-month trend from rollup rows.
+
+    ``rows`` are (month, billed, collected, outstanding, received) for any
+    subset of months; missing months count as zero.
+    """
+    by_month = {row[0]: row[1:] for row in rows}
+    trend = []
+    previous_received = None
+    for month in month_range(start, end):
+        billed, collected, outstanding, received = by_month.get(month, (0, 0, 0, 0))
+        change = None
+        if previous_received:
+            change = round((received - previous_received) / previous_received * 100, 1)
+        trend.append({
+            'month': month.strftime('%Y-%m'),
+            'billed': round(billed, 2),
+            'collected': round(collected, 2),
+            'outstanding': round(outstanding, 2),
+            'received': round(received, 2),
+            'collection_rate': round(collected / billed * 100, 1) if billed else None,
+            'received_change_pct': change,
+        })
+        previous_received = received
+    return trend
@@ -0,0 +1,271 @@
+import logging
+from datetime import date, datetime
+from flask import Blueprint, jsonify, request
+from models import db, Student, Fee, MonthlyRollup
+from fee_storage import fee_history
+from pagination import keyset_paginate, InvalidCursor
+from http_cache import page_etag, not_modified, with_etag
+
+logger = logging.getLogger('fee_manager')
+
+# Read-only JSON API; bump the prefix for incompatible changes
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+# Ids, seat numbers or months accepted in one batch lookup
+MAX_BATCH = 500
+
+STUDENT_FIELDS = {
+    'id': Student.id,
+    'name': Student.name,
+    'seat_number': Student.seat_number,
+    'phone_number': Student.phone_number,
+    'joining_date': Student.joining_date,
+    'monthly_fee': Student.monthly_fee,
+}
+# Columns of fee_history(); bound to the selectable per query
+FEE_FIELDS = ('id', 'month', 'amount', 'paid', 'payment_date')
+UNPAID_FIELDS = {
+    'id': Fee.id,
+    'student_id': Fee.student_id,
+    'name': Student.name,
+    'seat_number': Student.seat_number,
+    'phone_number': Student.phone_number,
+    'month': Fee.month,
+    'amount': Fee.amount,
+}
+SUMMARY_FIELDS = ('billed_amount', 'collected_amount', 'outstanding_amount',
+                  'paid_count', 'unpaid_count', 'received_amount')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'error': str(error)}), error.status
+
+
+@api.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    logger.warning(f'Invalid API page cursor: {str(error)}')
+    return jsonify({'error': 'Invalid cursor'}), 400
+
+
+def _json_value(name, value):
+    if name == 'month' and value is not None:
+        return value.strftime('%Y-%m')
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def _serialize(rows, names):
+    """Dicts of the ``names`` columns, read straight off the result rows"""
+    return [{name: _json_value(name, row._mapping[name]) for name in names} for row in rows]
+
+
+def _fields(available):
+    """Field names requested with ``?fields=``, always starting with ``id``"""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f'Unknown field(s): {", ".join(unknown)}; '
+                       f'available: {", ".join(available)}')
+    return ['id'] + [name for name in dict.fromkeys(names) if name != 'id']
+
+
+def _list_arg(name, convert=str):
+    raw = request.args.get(name)
+    if raw is None:
+        return None
+    try:
+        values = list(dict.fromkeys(convert(value.strip()) for value in raw.split(',') if value.strip()))
+    except ValueError:
+        raise ApiError(f'Invalid value in {name}')
+    if not values:
+        raise ApiError(f'{name} is empty')
+    if len(values) > MAX_BATCH:
+        raise ApiError(f'At most {MAX_BATCH} values in {name}')
+    return values
+
+
+def _month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def _month_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return _month(value)
+    except ValueError:
+        raise ApiError(f'{name} must be YYYY-MM')
+
+
+def _limit():
+    return min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+
+
+def _sorted_query(columns, sort_columns):
+    """Query for ``columns`` plus ``sort_columns`` labelled ``_sort0``,
+    ``_sort1``..., as ``_keyset_page`` expects"""
+    return db.session.query(*columns, *[c.label(f'_sort{i}') for i, c in enumerate(sort_columns)])
+
+
+def _keyset_page(query, sort_columns, descending=False):
+    """The page of ``query`` after ``?cursor=``, ``?limit=`` rows long"""
+    keys = [f'_sort{i}' for i in range(len(sort_columns))]
+    return keyset_paginate(query, sort_columns, lambda row: [row._mapping[key] for key in keys],
+                           cursor=request.args.get('cursor'), per_page=_limit(),
+                           descending=descending)
+
+
+def _page(query, sort_columns, names, descending=False):
+    """One keyset page of a ``_sorted_query`` as a response body"""
+    page = _keyset_page(query, sort_columns, descending)
+    return {'data': _serialize(page.items, names), 'next_cursor': page.next_cursor}
+
+
+def _cached(build):
+    """Answer with 304 if the client has the current version of this URL,
+    else with the JSON body from ``build()``"""
+    etag = page_etag('api', request.full_path)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_etag(jsonify(build()), etag)
+
+
+@api.route('/students')
+def students():
+    """Students by ``ids`` or ``seats`` (batch), or all students by name"""
+    names = _fields(STUDENT_FIELDS)
+    ids = _list_arg('ids', int)
+    seats = _list_arg('seats')
+
+    def build():
+        columns = [STUDENT_FIELDS[name].label(name) for name in names]
+        if ids is not None or seats is not None:
+            key, values = ('id', ids) if ids is not None else ('seat_number', seats)
+            rows = db.session.query(*columns, STUDENT_FIELDS[key].label('_key'))\
+                .filter(STUDENT_FIELDS[key].in_(values))\
+                .all()
+            found = {row._key: row for row in rows}
+            return {
+                'data': _serialize([found[value] for value in values if value in found], names),
+                'missing': [value for value in values if value not in found],
+            }
+        # (name, id) order, as on the dashboard, served by ix_student_name_id
+        sort_columns = [Student.name, Student.id]
+        return _page(_sorted_query(columns, sort_columns), sort_columns, names)
+
+    return _cached(build)
+
+
+@api.route('/students/<int:student_id>/fees')
+def student_fees(student_id):
+    """One student's live and archived fees, newest month first"""
+    names = _fields(FEE_FIELDS)
+
+    def build():
+        history = fee_history(student_id=student_id)
+        sort_columns = [history.c.month]
+        query = _sorted_query([history.c[name] for name in names], sort_columns)
+        body = _page(query, sort_columns, names, descending=True)
+        if not body['data'] and not request.args.get('cursor') \
+                and db.session.get(Student, student_id) is None:
+            raise ApiError(f'Student {student_id} not found', 404)
+        return body
+
+    return _cached(build)
+
+
+@api.route('/fees')
+def fees():
+    """Fee histories of several students (``student_ids`` or ``seats``) in
+    one call, keyed by student id, newest month first; ``since`` limits them
+    to recent months. Pages hold ``limit`` fees in all, so one student's
+    history may continue on the next page."""
+    names = _fields(FEE_FIELDS)
+    student_ids = _list_arg('student_ids', int)
+    seats = _list_arg('seats')
+    if (student_ids is None) == (seats is None):
+        raise ApiError('Pass either student_ids or seats')
+    since = _month_arg('since')
+
+    def build():
+        ids = student_ids
+        if ids is None:
+            ids = db.session.execute(
+                db.select(Student.id).where(Student.seat_number.in_(seats))
+            ).scalars().all()
+        history = fee_history(student_ids=ids)
+        # (student_id, month) is unique across live and archived fees
+        sort_columns = [history.c.student_id, history.c.month]
+        query = _sorted_query([history.c[name] for name in names], sort_columns)
+        if since is not None:
+            query = query.filter(history.c.month >= since)
+        page = _keyset_page(query, sort_columns, descending=True)
+
+        data = {}
+        for row, fee in zip(page.items, _serialize(page.items, names)):
+            data.setdefault(str(row._sort0), []).append(fee)
+        return {'data': data, 'next_cursor': page.next_cursor}
+
+    return _cached(build)
+
+
+@api.route('/fees/unpaid')
+def unpaid_fees():
+    """Unpaid fees, oldest month first; ``month`` for one month only,
+    ``due=1`` for months up to the current one"""
+    names = _fields(UNPAID_FIELDS)
+    month = _month_arg('month')
+    due = request.args.get('due') == '1'
+
+    def build():
+        sort_columns = [Fee.month, Fee.id]
+        query = _sorted_query([UNPAID_FIELDS[name].label(name) for name in names], sort_columns)\
+            .join(Student, Fee.student_id == Student.id)\
+            .filter(Fee.paid == False)
+        if month is not None:
+            query = query.filter(Fee.month == month)
+        if due:
+            query = query.filter(Fee.month <= date.today().replace(day=1))
+        return _page(query, sort_columns, names)
+
+    return _cached(build)
+
+
+@api.route('/summary')
+def summary():
+    """Monthly totals from the rollup for ``months`` (default: the current
+    month); months with no fees come back as zeros"""
+    months = _list_arg('months', _month) or [date.today().replace(day=1)]
+
+    def build():
+        rows = db.session.query(MonthlyRollup.month, *[getattr(MonthlyRollup, f) for f in SUMMARY_FIELDS])\
+            .filter(MonthlyRollup.month.in_(months))\
+            .all()
+        found = {row.month: row for row in rows}
+        data = []
+        for month in months:
+            row = found.get(month)
+            entry = {'month': month.strftime('%Y-%m')}
+            for field in SUMMARY_FIELDS:
+                entry[field] = _json_value(field, getattr(row, field)) if row is not None else 0
+            data.append(entry)
+        return {'data': data}
+
+    return _cached(build)
@@ -1,154 +1,591 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from flask_sqlalchemy import SQLAlchemy
+import time
+import logging
+from flask import (Flask, Blueprint, current_app, render_template, request, redirect,
+                   url_for, flash, jsonify)
+from functools import partial
 from datetime import datetime, date
-import calendar
+import click
 from dateutil.relativedelta import relativedelta
-from report_generator import generate_student_report, generate_monthly_report
-from logger_config import setup_logger
-from sqlalchemy import and_, exists
-
-# Set up logger
-logger = setup_logger()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-
-# Handle PostgreSQL URL from Render
-database_url = os.environ.get('DATABASE_URL')
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///fee_management.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-# Models
-class Student(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    seat_number = db.Column(db.String(20), unique=True, nullable=False)
-    phone_number = db.Column(db.String(15))
-    joining_date = db.Column(db.Date, nullable=False)
-    monthly_fee = db.Column(db.Float, nullable=False)
-    fees = db.relationship('Fee', backref='student', lazy=True)
-
-class Fee(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    month = db.Column(db.Date, nullable=False)
-    paid = db.Column(db.Boolean, default=False)
-    payment_date = db.Column(db.Date)
+from report_cache import ReportCache, data_version
+from report_jobs import ReportWorkerPool, render_monthly_report
+from rollups import ROLLUP_FIELDS, fee_state, fee_delta, add_contribution, new_deltas, nonzero
+from exports import stream_query_csv
+from analytics import latency_budget, aging_cutoffs, aging_report, collection_trend
+from bulk_import import (read_rows, batches, validate_students, validate_fee_payments,
+                         BulkImportError)
+from logger_config import setup_logger, init_request_ids
+from scheduler import MonthlyScheduler
+from reminders import ReminderRunner, dispatch_reminders
+from pagination import keyset_paginate, InvalidCursor
+from query_counter import init_query_counter
+from db_config import engine_options, init_engine_events, init_statement_timeout, without_statement_timeout
+from metrics import init_metrics, report_timer, observe_report
+from models import (db, insert_ignoring_duplicates, Student, Fee, FeeArchive, FeeGenerationLedger,
+                    MonthlyRollup, ReportJob, DataVersion, ReminderLog)
+from fee_storage import (fee_history, archived_keys, archivable_months, archive_month,
+                         ensure_fee_partitions, partition_fee_table)
+from http_cache import (init_http_cache, ensure_data_version_row, current_data_version, page_etag,
+                        not_modified, with_etag)
+from fragment_cache import FragmentCache, shared_backend
+from assets import init_assets, build_assets
+from api import api
+from sqlalchemy import and_, or_, exists, literal, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+
+logger = logging.getLogger('fee_manager')
+
+# Routes, CLI commands and error handlers; registered by create_app()
+bp = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config=None):
+    """Build the application.
+
+    Nothing here touches the database or imports ReportLab, so workers (or
+    a gunicorn ``preload_app`` parent) start quickly; create the schema
+    with 'flask --app app init-db'.
+    """
+    setup_logger()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+
+    # Handle PostgreSQL URL from Render
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///fee_management.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQL_QUERY_WARN'] = os.environ.get('SQL_QUERY_WARN') == '1'
+    app.config['SQL_QUERY_WARN_THRESHOLD'] = int(os.environ.get('SQL_QUERY_WARN_THRESHOLD', 20))
+    app.config['FEE_SCHEDULER'] = os.environ.get('FEE_SCHEDULER', '1') == '1'
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    init_engine_events(app, db)
+    init_statement_timeout(app, db)
+    init_request_ids(app)
+    init_query_counter(app, db)
+    init_metrics(app)
+    init_assets(app)
+    init_http_cache(app)
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+    return app
+
+# Rendered PDF reports, reused until the underlying data changes
+report_cache = ReportCache(
+    os.environ.get('REPORTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')),
+    max_bytes=int(os.environ.get('REPORT_CACHE_MAX_MB', 200)) * 1024 * 1024,
+    max_age=int(os.environ.get('REPORT_CACHE_MAX_AGE_DAYS', 7)) * 24 * 3600,
+    # Set to '/reports/' behind the bundled nginx config
+    x_accel_prefix=os.environ.get('REPORTS_X_ACCEL_PREFIX')
+)
+
+# Rendered dashboard tables, per data version; FRAGMENT_CACHE_BACKEND=file or
+# sqlite adds a tier shared by all workers at FRAGMENT_CACHE_PATH
+fragment_cache = FragmentCache(
+    max_entries=int(os.environ.get('FRAGMENT_CACHE_SIZE', 256)),
+    shared=shared_backend(
+        os.environ.get('FRAGMENT_CACHE_BACKEND'),
+        os.environ.get('FRAGMENT_CACHE_PATH',
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'fragments'))
+    )
+)
+# Rows in the dashboard's recent payments table
+RECENT_PAYMENTS = 30
+# Fees listed in the dashboard's due alert; the rest are on /unpaid_fees
+DUE_ALERT_ROWS = 20
+
+# Due-fee reminders started from the dashboard run in the background
+reminder_runner = ReminderRunner()
+
+# Large monthly reports are rendered in a process pool instead of the request
+report_pool = ReportWorkerPool(int(os.environ.get('REPORT_WORKERS', 0)) or None)
+REPORT_ASYNC_ROWS = int(os.environ.get('REPORT_ASYNC_ROWS', 2000))
+# Pending jobs older than this are assumed lost (e.g. the web worker restarted)
+REPORT_JOB_TIMEOUT = relativedelta(minutes=int(os.environ.get('REPORT_JOB_TIMEOUT_MINUTES', 15)))
+
+def apply_rollup_deltas(deltas):
+    """Add ``{month: {field: delta}}`` to the monthly rollup within the
+    current transaction, creating missing month rows"""
+    dialect = db.engine.dialect.name
+    for month, fields in nonzero(deltas).items():
+        values = {field: fields[field] for field in ROLLUP_FIELDS}
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(MonthlyRollup).values(month=month, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['month'],
+                set_={field: getattr(MonthlyRollup, field) + stmt.excluded[field] for field in ROLLUP_FIELDS}
+            )
+            db.session.execute(stmt)
+        else:
+            result = db.session.execute(
+                db.update(MonthlyRollup)
+                    .where(MonthlyRollup.month == month)
+                    .values({field: getattr(MonthlyRollup, field) + value for field, value in values.items()})
+            )
+            if result.rowcount == 0:
+                db.session.execute(db.insert(MonthlyRollup).values(month=month, **values))
+
+def rebuild_monthly_rollups():
+    """Recompute the monthly rollup from live and archived fees; the caller
+    commits"""
+    fees = fee_history()
+    billing = db.session.query(
+            fees.c.month,
+            db.func.sum(fees.c.amount),
+            db.func.sum(db.case((fees.c.paid == True, fees.c.amount), else_=0)),
+            db.func.sum(db.case((fees.c.paid == True, 1), else_=0)),
+            db.func.count(fees.c.id)
+        )\
+        .group_by(fees.c.month)\
+        .all()
+    # Grouped by day, then bucketed by month here to stay dialect-neutral
+    received = db.session.query(fees.c.payment_date, db.func.sum(fees.c.amount))\
+        .filter(fees.c.paid == True, fees.c.payment_date != None)\
+        .group_by(fees.c.payment_date)\
+        .all()
+
+    totals = new_deltas()
+    for month, billed, collected, paid_count, count in billing:
+        row = totals[month.replace(day=1)]
+        row['billed_amount'] += billed or 0
+        row['collected_amount'] += collected or 0
+        row['outstanding_amount'] += (billed or 0) - (collected or 0)
+        row['paid_count'] += paid_count or 0
+        row['unpaid_count'] += count - (paid_count or 0)
+    for payment_date, amount in received:
+        totals[payment_date.replace(day=1)]['received_amount'] += amount or 0
+
+    db.session.execute(db.delete(MonthlyRollup))
+    if totals:
+        db.session.execute(db.insert(MonthlyRollup), [
+            dict(month=month, **fields) for month, fields in totals.items()
+        ])
+    return len(totals)
 
 def init_db():
-    with app.app_context():
-        db.create_all()
-        
-# Initialize database tables
-init_db()
+    """Create missing tables; call within an app context"""
+    db.create_all()
+    # A new database gets a new generation stamp, so fragments cached for
+    # another one are never served; drop them to free the space
+    if ensure_data_version_row():
+        fragment_cache.invalidate()
+    # A newly created rollup table over existing fees starts out empty
+    if MonthlyRollup.query.first() is None and Fee.query.first() is not None:
+        try:
+            rebuild_monthly_rollups()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error building monthly rollups: {str(e)}', exc_info=True)
 
-def generate_fees_for_all_students():
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create the database tables."""
+    init_db()
+    click.echo('Database initialised')
+
+def insert_missing_fees(month, *criteria):
+    """INSERT ... SELECT the ``month`` fee for every student matching
+    ``criteria`` that does not have one yet. Returns the number of rows
+    inserted; the caller commits.
+    """
+    # Anti-join: students without a live or archived fee for this month
+    missing = db.select(
+        Student.id,
+        Student.monthly_fee,
+        literal(month, type_=db.Date),
+        literal(False, type_=db.Boolean)
+    ).where(~exists().where(and_(
+        Fee.student_id == Student.id,
+        Fee.month == month
+    )), ~exists().where(and_(
+        FeeArchive.student_id == Student.id,
+        FeeArchive.month == month
+    )), *criteria)
+
+    stmt = insert_ignoring_duplicates(Fee).from_select(
+        ['student_id', 'amount', 'month', 'paid'], missing
+    )
+    if db.engine.dialect.insert_returning:
+        amounts = db.session.execute(stmt.returning(Fee.amount)).scalars().all()
+    else:
+        amounts = [amount for _, amount, _, _ in db.session.execute(missing)]
+        db.session.execute(stmt)
+
+    if amounts:
+        total = sum(amounts)
+        deltas = new_deltas()
+        deltas[month].update(billed_amount=total, outstanding_amount=total, unpaid_count=len(amounts))
+        apply_rollup_deltas(deltas)
+    return len(amounts)
+
+def generate_fees_for_all_students(month=None):
+    """Create the fee row for ``month`` (default: current month) for every
+    student that does not have one yet, in a single INSERT ... SELECT.
+
+    Returns the number of fee rows created.
+    """
     try:
-        students = Student.query.all()
-        current_date = datetime.now().date()
-        current_month = date(current_date.year, current_date.month, 1)
-        
-        for student in students:
-            # Check if fee for current month exists
-            existing_fee = Fee.query.filter_by(
-                student_id=student.id,
-                month=current_month
-            ).first()
-            
-            if not existing_fee:
-                new_fee = Fee(
-                    student_id=student.id,
-                    amount=student.monthly_fee,
-                    month=current_month,
-                    paid=False
-                )
-                db.session.add(new_fee)
-        
+        if month is None:
+            current_date = datetime.now().date()
+            month = date(current_date.year, current_date.month, 1)
+
+        # Serialise concurrent generators (one per gunicorn worker) for the
+        # same month. SQLite already holds its single writer lock for the
+        # duration of the INSERT statement below, and the unique
+        # (student_id, month) index turns any remaining race into a no-op.
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(
+                text('SELECT pg_advisory_xact_lock(:key)'),
+                {'key': month.year * 100 + month.month}
+            )
+            ensure_fee_partitions(month)
+
+        created = insert_missing_fees(month)
+
+        # Record the month in the ledger within the same transaction
+        ledger = db.session.get(FeeGenerationLedger, month)
+        if ledger is None:
+            db.session.add(FeeGenerationLedger(month=month, fee_count=created))
+        else:
+            ledger.generated_at = datetime.now()
+            ledger.fee_count += created
+
         db.session.commit()
-        logger.info('Fees generated for all students')
+        _generated_months.add(month)
+        logger.info(f'Fees generated for {month.strftime("%B %Y")}: {created} new record(s)')
+        return created
     except Exception as e:
         logger.error(f'Error generating fees: {str(e)}', exc_info=True)
         db.session.rollback()
+        return None
+
+# Months this worker has already seen in the generation ledger
+_generated_months = set()
+
+def ensure_fees_generated(month=None):
+    """Generate fees for ``month`` unless the ledger says it is already done.
+
+    Once a month has been seen in the ledger, later calls in this worker
+    return without touching the database. Returns the number of fees
+    created (0 if the month was already done), or None if generation failed.
+    """
+    if month is None:
+        current_date = datetime.now().date()
+        month = date(current_date.year, current_date.month, 1)
+
+    if month in _generated_months:
+        return 0
+    if db.session.get(FeeGenerationLedger, month) is not None:
+        _generated_months.add(month)
+        return 0
+    return generate_fees_for_all_students(month)
+
+def _scheduled_fee_generation(app):
+    with app.app_context():
+        # Raise so the scheduler leaves the month pending and retries it
+        if ensure_fees_generated() is None:
+            raise RuntimeError('Fee generation failed')
+
+def start_fee_scheduler(app):
+    """Start the in-process month rollover scheduler for this worker"""
+    scheduler = MonthlyScheduler(partial(_scheduled_fee_generation, app))
+    scheduler.start()
+    return scheduler
+
+# pid of the process whose scheduler is running
+_scheduler_pid = None
+
+@bp.before_app_request
+def start_scheduler_once():
+    # Started on the first request rather than in create_app() so that it
+    # runs in each worker, not in a preload_app parent that forks them
+    global _scheduler_pid
+    if _scheduler_pid != os.getpid() and current_app.config['FEE_SCHEDULER']:
+        _scheduler_pid = os.getpid()
+        start_fee_scheduler(current_app._get_current_object())
+
+@bp.cli.command('generate-fees')
+@click.option('--month', help='Billing month as YYYY-MM (default: current month)')
+def generate_fees_command(month):
+    """Generate missing fee records for a billing month."""
+    target = datetime.strptime(month + '-01', '%Y-%m-%d').date() if month else None
+    created = generate_fees_for_all_students(target)
+    if created is None:
+        raise click.ClickException('Fee generation failed, see logs for details')
+    click.echo(f'{created} fee record(s) created')
+
+def _dedupe_fees():
+    """Delete duplicate (student_id, month) fee rows, keeping the paid one
+    (or the oldest if none is paid). Returns the number of rows deleted."""
+    duplicates = db.session.query(Fee.student_id, Fee.month)\
+        .group_by(Fee.student_id, Fee.month)\
+        .having(db.func.count(Fee.id) > 1)\
+        .all()
+    deleted = 0
+    for student_id, month in duplicates:
+        fees = Fee.query.filter_by(student_id=student_id, month=month)\
+            .order_by(Fee.paid.desc(), Fee.id)\
+            .all()
+        for fee in fees[1:]:
+            db.session.delete(fee)
+            deleted += 1
+    return deleted
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the monthly collection rollup from the fee table."""
+    months = rebuild_monthly_rollups()
+    db.session.commit()
+    click.echo(f'Monthly rollup rebuilt for {months} month(s)')
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the files under static/."""
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f'Built {len(manifest)} static asset(s)')
+
+@bp.cli.command('send-reminders')
+@click.option('--dry-run', is_flag=True, help='Count the reminders without sending them')
+def send_reminders_command(dry_run):
+    """Message every student with unpaid fees they have not been reminded of."""
+    counts = dispatch_reminders(dry_run=dry_run)
+    if dry_run:
+        click.echo(f'{counts["students"]} student(s) would be reminded of {counts["fees"]} fee(s)')
+        return
+    click.echo(f'Reminders sent: {counts["sent"]}, failed: {counts["failed"]}, '
+               f'claimed by another run: {counts["skipped"]} fee(s)')
+    if counts['failed']:
+        raise click.ClickException(f'{counts["failed"]} reminder(s) failed; re-run to retry them')
+
+@bp.cli.command('archive-fees')
+@click.option('--keep-months', type=int, default=3, show_default=True,
+              help='Months before the current one that stay in the live fee table')
+@click.option('--dry-run', is_flag=True, help='List the months that would be archived')
+def archive_fees_command(keep_months, dry_run):
+    """Move fully paid months into the fee archive table."""
+    current = date.today().replace(day=1)
+    months = archivable_months(current - relativedelta(months=keep_months))
+    if dry_run:
+        for month in months:
+            click.echo(f'Would archive {month.strftime("%B %Y")}')
+        return
+    moved = 0
+    for month in months:
+        # One transaction per month keeps the write lock short
+        try:
+            count = archive_month(month)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error archiving fees for {month.strftime("%B %Y")}: {str(e)}', exc_info=True)
+            raise click.ClickException(f'Archiving {month.strftime("%B %Y")} failed, see logs for details')
+        moved += count
+        click.echo(f'Archived {count} fee(s) for {month.strftime("%B %Y")}')
+    fragment_cache.invalidate()
+    logger.info(f'Archived {moved} fee(s) from {len(months)} month(s)')
+
+@bp.cli.command('partition-fees')
+@click.option('--ahead', type=int, default=2, show_default=True,
+              help='Months past the current one to create partitions for')
+def partition_fees_command(ahead):
+    """Convert the fee table to monthly range partitions (PostgreSQL)."""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Partitioning needs PostgreSQL; on SQLite use archive-fees')
+    try:
+        created = partition_fee_table(ahead)
+        if not created:
+            ensure_fee_partitions(date.today().replace(day=1), ahead)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error partitioning the fee table: {str(e)}', exc_info=True)
+        raise click.ClickException('Partitioning failed, see logs for details')
+    if created:
+        click.echo(f'Fee table partitioned into {created} monthly partition(s)')
+    else:
+        click.echo('Fee table is already partitioned; upcoming partitions ensured')
+    logger.info('Fee table partitioned')
+
+@bp.cli.command('upgrade-db')
+@click.option('--dedupe', is_flag=True,
+              help='Remove duplicate fees for the same student and month before adding the unique index')
+def upgrade_db_command(dedupe):
+    """Create missing tables and indexes on an existing database."""
+    db.create_all()
+
+    duplicate_groups = db.session.query(Fee.student_id, Fee.month)\
+        .group_by(Fee.student_id, Fee.month)\
+        .having(db.func.count(Fee.id) > 1)\
+        .count()
+    if duplicate_groups:
+        if not dedupe:
+            raise click.ClickException(
+                f'{duplicate_groups} student/month pair(s) have more than one fee record; '
+                're-run with --dedupe to keep one record per pair'
+            )
+        deleted = _dedupe_fees()
+        db.session.commit()
+        click.echo(f'Removed {deleted} duplicate fee record(s)')
+
+    if ensure_data_version_row():
+        fragment_cache.invalidate()
+    for model in (Student, Fee, FeeArchive, FeeGenerationLedger, MonthlyRollup, ReportJob, DataVersion,
+                  ReminderLog):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+            click.echo(f'Index {index.name} ready')
+
+    months = rebuild_monthly_rollups()
+    db.session.commit()
+    click.echo(f'Monthly rollup rebuilt for {months} month(s)')
+    logger.info('Database upgraded')
+
+def student_search_filter(q):
+    """Match students whose name contains ``q`` or whose seat number starts with it"""
+    return or_(
+        Student.name.icontains(q, autoescape=True),
+        Student.seat_number.istartswith(q, autoescape=True)
+    )
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def dashboard():
     try:
         # Generate fees for current month if not already generated
-        generate_fees_for_all_students()
-        
-        students = Student.query.all()
+        ensure_fees_generated()
+
+        # Unchanged since the browser's copy: skip the queries below
+        etag = page_etag('dashboard')
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
-        # Get unpaid fees with student information
-        unpaid_fees = db.session.query(Fee, Student)\
-            .join(Student)\
-            .filter(Fee.paid == False)\
-            .order_by(Student.name, Fee.month)\
-            .all()
-            
-        # Get paid fees with student information (last 30 entries)
-        paid_fees = db.session.query(Fee, Student)\
-            .join(Student)\
-            .filter(Fee.paid == True)\
-            .order_by(Fee.payment_date.desc())\
-            .limit(30)\
-            .all()
-            
-        # Calculate monthly collection
-        current_month_start = datetime.now().date().replace(day=1)
-        monthly_collection = db.session.query(db.func.sum(Fee.amount))\
-            .filter(
-                Fee.paid == True,
-                Fee.payment_date >= current_month_start
-            ).scalar() or 0
-            
-        # Get fees due today
+        q = request.args.get('q', '').strip()
         today = datetime.now().date()
         current_month = today.replace(day=1)
-        
-        # First, get all students who haven't paid for the current month
-        unpaid_students = db.session.query(Student)\
-            .outerjoin(Fee, and_(
-                Fee.student_id == Student.id,
-                Fee.month == current_month,
-                Fee.paid == True
-            ))\
-            .filter(Fee.id == None)\
-            .all()
-            
-        # Then get their unpaid fees
+
+        # The tables are cached as rendered HTML per database and data
+        # version; their pager links carry every query parameter, so all of
+        # them are keyed
+        version = (db.engine.url.render_as_string(hide_password=True), current_data_version())
+        params = (tuple(sorted(request.args.items(multi=True))), today)
+
+        def render_students():
+            # One page of students, ordered by (name, id)
+            student_query = Student.query
+            if q:
+                student_query = student_query.filter(student_search_filter(q))
+            students = keyset_paginate(
+                student_query,
+                [Student.name, Student.id],
+                key=lambda student: (student.name, student.id),
+                cursor=request.args.get('students_after')
+            )
+            return render_template('_dashboard_students.html', students=students)
+
+        def render_unpaid():
+            # One page of unpaid fees with student information, oldest first
+            unpaid_query = db.session.query(Fee, Student)\
+                .join(Student)\
+                .filter(Fee.paid == False)
+            if q:
+                unpaid_query = unpaid_query.filter(student_search_filter(q))
+            unpaid_fees = keyset_paginate(
+                unpaid_query,
+                [Fee.month, Fee.id],
+                key=lambda row: (row[0].month, row[0].id),
+                cursor=request.args.get('unpaid_after')
+            )
+            return render_template('_dashboard_unpaid.html', unpaid_fees=unpaid_fees, today=today)
+
+        def render_paid():
+            # Get paid fees with student information (last 30 entries)
+            paid_fees = db.session.query(Fee, Student)\
+                .join(Student)\
+                .filter(Fee.paid == True)\
+                .order_by(Fee.payment_date.desc())\
+                .limit(RECENT_PAYMENTS)\
+                .all()
+            return render_template('_dashboard_paid.html', paid_fees=paid_fees)
+
+        students_html = fragment_cache.get_or_render('students', version, params, render_students)
+        unpaid_html = fragment_cache.get_or_render('unpaid', version, params, render_unpaid)
+        paid_html = fragment_cache.get_or_render('paid', version, (), render_paid)
+
+
+        # Summary cards: all counters in a single round trip
+        summary = db.session.query(
+            db.select(db.func.count(Student.id)).scalar_subquery(),
+            db.select(db.func.coalesce(db.func.sum(MonthlyRollup.unpaid_count), 0))
+                .scalar_subquery(),
+            db.select(db.func.coalesce(db.func.sum(MonthlyRollup.paid_count), 0))
+                .scalar_subquery(),
+            db.func.coalesce(
+                db.select(MonthlyRollup.received_amount)
+                    .where(MonthlyRollup.month == current_month)
+                    .scalar_subquery(),
+                0
+            ),
+            db.func.coalesce(
+                db.select(MonthlyRollup.unpaid_count)
+                    .where(MonthlyRollup.month == current_month)
+                    .scalar_subquery(),
+                0
+            )
+        ).one()
+        total_students, unpaid_count, paid_count, monthly_collection, due_count = summary
+
+        # Fees due today: the first few unpaid current-month fees, with their
+        # student; due_count has the total
         due_today = []
-        for student in unpaid_students:
-            unpaid_fee = db.session.query(Fee)\
+        if due_count:
+            due_today = db.session.query(Fee, Student)\
+                .join(Student)\
                 .filter(
-                    Fee.student_id == student.id,
                     Fee.month == current_month,
                     Fee.paid == False
-                ).first()
-            if unpaid_fee:
-                due_today.append((unpaid_fee, student))
+                )\
+                .order_by(Student.name, Student.id)\
+                .limit(DUE_ALERT_ROWS)\
+                .all()
             
         logger.info('Dashboard accessed successfully')
-        return render_template('dashboard.html', 
-                            students=students, 
-                            unpaid_fees=unpaid_fees,
-                            paid_fees=paid_fees,
+        return with_etag(render_template('dashboard.html', 
+                            students_html=students_html,
+                            unpaid_html=unpaid_html,
+                            paid_html=paid_html,
+                            recent_payments=min(paid_count, RECENT_PAYMENTS),
                             due_today=due_today,
+                            due_count=due_count,
+                            current_month=current_month,
+                            total_students=total_students,
+                            unpaid_count=unpaid_count,
                             monthly_collection=monthly_collection,
-                            today=today)
+                            today=today,
+                            q=q), etag)
+    except InvalidCursor as e:
+        logger.warning(f'Invalid dashboard page cursor: {str(e)}')
+        flash('Invalid page link', 'error')
+        return redirect(url_for('main.dashboard'))
     except Exception as e:
         logger.error(f'Error accessing dashboard: {str(e)}', exc_info=True)
         flash('Error loading dashboard', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-@app.route('/add_student', methods=['GET', 'POST'])
+@bp.route('/add_student', methods=['GET', 'POST'])
 def add_student():
     if request.method == 'POST':
         try:
@@ -156,7 +593,7 @@ def add_student():
             if not joining_date_str:
                 logger.warning('Add student attempt failed: Missing joining date')
                 flash('Joining date is required', 'error')
-                return redirect(url_for('add_student'))
+                return redirect(url_for('main.add_student'))
 
             student = Student(
                 name=request.form.get('name'),
@@ -166,23 +603,221 @@ def add_student():
                 monthly_fee=float(request.form.get('monthly_fee', 1000.0))
             )
             db.session.add(student)
+            db.session.flush()
+
+            # Generate fee for current month for new student
+            current_date = datetime.now().date()
+            fee = Fee(
+                student_id=student.id,
+                amount=student.monthly_fee,
+                month=date(current_date.year, current_date.month, 1),
+                paid=False
+            )
+            db.session.add(fee)
+            apply_rollup_deltas(fee_delta(None, fee_state(fee)))
             db.session.commit()
+            fragment_cache.invalidate()
             
             logger.info(f'New student added successfully: {student.name} (ID: {student.id})')
-            
-            # Generate fee for current month for new student
-            generate_fees_for_all_students()
             flash('Student added successfully', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         except Exception as e:
             db.session.rollback()
             logger.error(f'Error adding student: {str(e)}', exc_info=True)
             flash(f'Error adding student: {str(e)}', 'error')
-            return redirect(url_for('add_student'))
+            return redirect(url_for('main.add_student'))
     
     return render_template('add_student.html')
 
-@app.route('/edit_student/<int:student_id>', methods=['GET', 'POST'])
+def bulk_add_students(valid):
+    """Insert validated student rows in batched transactions, creating the
+    current month's fee for the new students only. Returns (created, errors)."""
+    current_date = datetime.now().date()
+    current_month = date(current_date.year, current_date.month, 1)
+    created, errors = 0, []
+
+    for batch in batches(valid):
+        seats = [values['seat_number'] for _, values in batch]
+        existing = set(db.session.scalars(
+            db.select(Student.seat_number).where(Student.seat_number.in_(seats))
+        ))
+        rows = []
+        for number, values in batch:
+            if values['seat_number'] in existing:
+                errors.append({'row': number, 'errors': [f'Seat number {values["seat_number"]} already exists']})
+            else:
+                rows.append((number, values))
+        if not rows:
+            continue
+
+        try:
+            db.session.execute(db.insert(Student), [values for _, values in rows])
+            insert_missing_fees(current_month, Student.seat_number.in_(
+                [values['seat_number'] for _, values in rows]
+            ))
+            db.session.commit()
+            created += len(rows)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error importing student batch: {str(e)}', exc_info=True)
+            errors.extend({'row': number, 'errors': [f'Not saved: {str(e)}']} for number, _ in rows)
+    return created, errors
+
+def bulk_mark_fees_paid(valid):
+    """Mark validated (seat_number, month) fees paid in batched transactions,
+    creating fee rows that do not exist yet. Returns (created, updated, errors)."""
+    created, updated, errors = 0, 0, []
+
+    for batch in batches(valid):
+        seats = {values['seat_number'] for _, values in batch}
+        students = {
+            seat_number: (student_id, monthly_fee)
+            for seat_number, student_id, monthly_fee in db.session.execute(
+                db.select(Student.seat_number, Student.id, Student.monthly_fee)
+                    .where(Student.seat_number.in_(seats))
+            )
+        }
+
+        rows = []
+        for number, values in batch:
+            if values['seat_number'] not in students:
+                errors.append({'row': number, 'errors': [f'Unknown seat number {values["seat_number"]}']})
+            else:
+                rows.append((number, values))
+        if not rows:
+            continue
+
+        student_ids = {students[values['seat_number']][0] for _, values in rows}
+        months = {values['month'] for _, values in rows}
+        # Archived fees are already paid and can no longer change
+        archived = archived_keys(student_ids, months)
+        if archived:
+            kept = []
+            for number, values in rows:
+                if (students[values['seat_number']][0], values['month']) in archived:
+                    errors.append({'row': number, 'errors': [
+                        f'Fee for {values["month"].strftime("%B %Y")} is archived'
+                    ]})
+                else:
+                    kept.append((number, values))
+            rows = kept
+            if not rows:
+                continue
+        # Locked until commit, so a concurrent edit of the same fees waits
+        # and the rollup deltas below start from the state actually replaced;
+        # id order keeps two overlapping batches from deadlocking
+        existing = {
+            (student_id, month): (fee_id, amount, paid, payment_date)
+            for fee_id, student_id, month, amount, paid, payment_date in db.session.execute(
+                db.select(Fee.id, Fee.student_id, Fee.month, Fee.amount, Fee.paid, Fee.payment_date)
+                    .where(Fee.student_id.in_(student_ids), Fee.month.in_(months))
+                    .order_by(Fee.id)
+                    .with_for_update()
+            )
+        }
+
+        updates, inserts = [], []
+        deltas = new_deltas()
+        for _, values in rows:
+            student_id, monthly_fee = students[values['seat_number']]
+            fee = existing.get((student_id, values['month']))
+            if fee is not None:
+                fee_id, amount, paid, payment_date = fee
+                new_amount = values['amount'] if values['amount'] is not None else amount
+                updates.append({
+                    'id': fee_id,
+                    'amount': new_amount,
+                    'paid': True,
+                    'payment_date': values['payment_date']
+                })
+                fee_delta((values['month'], amount, bool(paid), payment_date),
+                          (values['month'], new_amount, True, values['payment_date']), deltas)
+            else:
+                new_amount = values['amount'] if values['amount'] is not None else monthly_fee
+                inserts.append({
+                    'student_id': student_id,
+                    'month': values['month'],
+                    'amount': new_amount,
+                    'paid': True,
+                    'payment_date': values['payment_date']
+                })
+                fee_delta(None, (values['month'], new_amount, True, values['payment_date']), deltas)
+
+        try:
+            if updates:
+                db.session.execute(db.update(Fee), updates)
+            if inserts:
+                db.session.execute(db.insert(Fee), inserts)
+            apply_rollup_deltas(deltas)
+            db.session.commit()
+            created += len(inserts)
+            updated += len(updates)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error marking fee batch paid: {str(e)}', exc_info=True)
+            errors.extend({'row': number, 'errors': [f'Not saved: {str(e)}']} for number, _ in rows)
+    return created, updated, errors
+
+def _bulk_response(kind, result):
+    result['errors'].sort(key=lambda error: error['row'])
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        return jsonify(result), 200 if not result['errors'] else 207
+    if result['errors']:
+        flash(f'{len(result["errors"])} row(s) were not imported', 'warning')
+    else:
+        flash('Import completed successfully', 'success')
+    return render_template('bulk_import.html', kind=kind, result=result)
+
+@bp.route('/bulk_import')
+def bulk_import():
+    return render_template('bulk_import.html', kind=None, result=None)
+
+@bp.route('/bulk_import/students', methods=['POST'])
+def bulk_import_students():
+    try:
+        rows = read_rows(request)
+    except BulkImportError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('main.bulk_import'))
+
+    valid, errors = validate_students(rows)
+    created, write_errors = bulk_add_students(valid)
+    if created:
+        fragment_cache.invalidate()
+    logger.info(f'Bulk student import: {created} created, {len(errors) + len(write_errors)} rejected')
+    return _bulk_response('students', {
+        'total': len(rows),
+        'created': created,
+        'updated': 0,
+        'errors': errors + write_errors
+    })
+
+@bp.route('/bulk_import/fees', methods=['POST'])
+def bulk_mark_paid():
+    try:
+        rows = read_rows(request)
+    except BulkImportError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('main.bulk_import'))
+
+    valid, errors = validate_fee_payments(rows, datetime.now().date())
+    created, updated, write_errors = bulk_mark_fees_paid(valid)
+    if created or updated:
+        fragment_cache.invalidate()
+    logger.info(f'Bulk fee payment: {created} created, {updated} updated, '
+                f'{len(errors) + len(write_errors)} rejected')
+    return _bulk_response('fees', {
+        'total': len(rows),
+        'created': created,
+        'updated': updated,
+        'errors': errors + write_errors
+    })
+
+@bp.route('/edit_student/<int:student_id>', methods=['GET', 'POST'])
 def edit_student(student_id):
     student = Student.query.get_or_404(student_id)
     if request.method == 'POST':
@@ -191,7 +826,7 @@ def edit_student(student_id):
             if not joining_date_str:
                 logger.warning(f'Edit student attempt failed: Missing joining date for student ID {student_id}')
                 flash('Joining date is required', 'error')
-                return redirect(url_for('edit_student', student_id=student_id))
+                return redirect(url_for('main.edit_student', student_id=student_id))
 
             student.name = request.form.get('name')
             student.seat_number = request.form.get('seat_number')
@@ -200,29 +835,41 @@ def edit_student(student_id):
             student.monthly_fee = float(request.form.get('monthly_fee', student.monthly_fee))
             
             db.session.commit()
+            fragment_cache.invalidate()
             logger.info(f'Student updated successfully: {student.name} (ID: {student.id})')
             flash('Student updated successfully', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         except Exception as e:
             db.session.rollback()
             logger.error(f'Error updating student ID {student_id}: {str(e)}', exc_info=True)
             flash(f'Error updating student: {str(e)}', 'error')
-            return redirect(url_for('edit_student', student_id=student_id))
+            return redirect(url_for('main.edit_student', student_id=student_id))
     
     return render_template('edit_student.html', student=student)
 
-@app.route('/delete_student/<int:student_id>', methods=['POST'])
+@bp.route('/delete_student/<int:student_id>', methods=['POST'])
 def delete_student(student_id):
     try:
         student = Student.query.get_or_404(student_id)
         name = student.name
         
-        # First delete all associated fees
+        # Remove the student's fees from the monthly rollup
+        fees = fee_history(student_id=student_id)
+        deltas = new_deltas()
+        for state in db.session.query(fees.c.month, fees.c.amount, fees.c.paid, fees.c.payment_date):
+            add_contribution(deltas, tuple(state), sign=-1)
+        apply_rollup_deltas(deltas)
+
+        # First delete all associated fees, live and archived
         Fee.query.filter_by(student_id=student_id).delete()
+        FeeArchive.query.filter_by(student_id=student_id).delete()
+        # Fee ids may be reused once deleted
+        ReminderLog.query.filter_by(student_id=student_id).delete()
         
         # Then delete the student
         db.session.delete(student)
         db.session.commit()
+        fragment_cache.invalidate()
         
         logger.info(f'Student deleted successfully: {name} (ID: {student_id})')
         flash('Student deleted successfully', 'success')
@@ -230,9 +877,18 @@ def delete_student(student_id):
         db.session.rollback()
         logger.error(f'Error deleting student ID {student_id}: {str(e)}', exc_info=True)
         flash(f'Error deleting student: {str(e)}', 'error')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/reminders/send', methods=['POST'])
+def send_reminders():
+    if reminder_runner.start(current_app._get_current_object()):
+        logger.info('Reminder run started from the dashboard')
+        flash('Sending fee reminders in the background', 'info')
+    else:
+        flash('Reminders are already being sent', 'warning')
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/add_fee/<int:student_id>', methods=['GET', 'POST'])
+@bp.route('/add_fee/<int:student_id>', methods=['GET', 'POST'])
 def add_fee(student_id):
     student = Student.query.get_or_404(student_id)
     if request.method == 'POST':
@@ -244,30 +900,38 @@ def add_fee(student_id):
             if not month_str:
                 logger.warning(f'Add fee attempt failed: Missing month for student ID {student_id}')
                 flash('Month is required', 'error')
-                return redirect(url_for('add_fee', student_id=student_id))
+                return redirect(url_for('main.add_fee', student_id=student_id))
                 
             if not payment_date_str and is_paid:
                 logger.warning(f'Add fee attempt failed: Missing payment date for paid fee (student ID {student_id})')
                 flash('Payment date is required for paid fees', 'error')
-                return redirect(url_for('add_fee', student_id=student_id))
+                return redirect(url_for('main.add_fee', student_id=student_id))
 
             # Convert month string (YYYY-MM) to date object
             month = datetime.strptime(month_str + '-01', '%Y-%m-%d').date()
             amount = float(request.form.get('amount', student.monthly_fee))
+
+            if archived_keys([student_id], [month]):
+                logger.warning(f'Add fee attempt failed: {month_str} is archived for student ID {student_id}')
+                flash(f'The fee for {month.strftime("%B %Y")} is paid and archived', 'error')
+                return redirect(url_for('main.add_fee', student_id=student_id))
             
-            # Check if fee record already exists for this month
+            # Check if fee record already exists for this month, locking it
+            # so the rollup delta is taken from the state this edit replaces
             existing_fee = Fee.query.filter(
                 Fee.student_id == student_id,
                 Fee.month == month
-            ).first()
+            ).with_for_update().first()
             
             if existing_fee:
+                old_state = fee_state(existing_fee)
                 existing_fee.amount = amount
                 existing_fee.paid = is_paid
                 if payment_date_str:
                     existing_fee.payment_date = datetime.strptime(payment_date_str, '%Y-%m-%d').date()
                 elif not is_paid:
                     existing_fee.payment_date = None
+                apply_rollup_deltas(fee_delta(old_state, fee_state(existing_fee)))
                 logger.info(f'Fee record updated for student ID {student_id}: Month {month_str}, Paid: {is_paid}')
             else:
                 fee = Fee(
@@ -278,105 +942,443 @@ def add_fee(student_id):
                     payment_date=datetime.strptime(payment_date_str, '%Y-%m-%d').date() if payment_date_str and is_paid else None
                 )
                 db.session.add(fee)
+                apply_rollup_deltas(fee_delta(None, fee_state(fee)))
                 logger.info(f'New fee record added for student ID {student_id}: Month {month_str}, Paid: {is_paid}')
             
             db.session.commit()
+            fragment_cache.invalidate()
             flash('Fee payment updated successfully', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         except Exception as e:
             db.session.rollback()
             logger.error(f'Error adding fee for student ID {student_id}: {str(e)}', exc_info=True)
             flash(f'Error adding fee payment: {str(e)}', 'error')
-            return redirect(url_for('add_fee', student_id=student_id))
+            return redirect(url_for('main.add_fee', student_id=student_id))
     
     today = datetime.now().date().strftime('%Y-%m-%d')
     return render_template('add_fee.html', student=student, today=today)
 
-@app.route('/student/<int:student_id>')
+@bp.route('/student/<int:student_id>')
 def student_details(student_id):
     try:
+        etag = page_etag('student', student_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         student = Student.query.get_or_404(student_id)
+        # Live and archived fees in one query, newest first
+        history = fee_history(student_id=student_id)
+        fees = db.session.execute(db.select(history).order_by(history.c.month.desc())).all()
         logger.info(f'Student details accessed successfully: {student.name} (ID: {student_id})')
-        return render_template('student_details.html', student=student)
+        return with_etag(render_template('student_details.html', student=student, fees=fees), etag)
     except Exception as e:
         logger.error(f'Error accessing student details: {str(e)}', exc_info=True)
         flash('Error loading student details', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.dashboard'))
 
-@app.route('/unpaid_fees')
+@bp.route('/unpaid_fees')
 def unpaid_fees():
     # Generate fees for current month if not already generated
-    generate_fees_for_all_students()
+    ensure_fees_generated()
     
     try:
-        # Get all students with unpaid fees
-        unpaid = Fee.query.filter_by(paid=False).join(Student).order_by(Fee.month.desc()).all()
+        etag = page_etag('unpaid_fees')
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        q = request.args.get('q', '').strip()
+        month_str = request.args.get('month', '').strip()
+        try:
+            month = datetime.strptime(month_str, '%Y-%m').date() if month_str else None
+        except ValueError:
+            logger.warning(f'Invalid unpaid fees month: {month_str}')
+            flash('Invalid month', 'error')
+            return redirect(url_for('main.unpaid_fees'))
+
+        # One page of unpaid fees, newest month first
+        query = Fee.query.filter_by(paid=False)\
+            .join(Student)\
+            .options(contains_eager(Fee.student))
+        if month:
+            query = query.filter(Fee.month == month)
+        if q:
+            query = query.filter(student_search_filter(q))
+        unpaid = keyset_paginate(
+            query,
+            [Fee.month, Fee.id],
+            key=lambda fee: (fee.month, fee.id),
+            cursor=request.args.get('after'),
+            descending=True
+        )
         logger.info('Unpaid fees accessed successfully')
-        return render_template('unpaid_fees.html', unpaid_fees=unpaid)
+        return with_etag(render_template('unpaid_fees.html', unpaid_fees=unpaid, q=q, month=month), etag)
+    except InvalidCursor as e:
+        logger.warning(f'Invalid unpaid fees page cursor: {str(e)}')
+        flash('Invalid page link', 'error')
+        return redirect(url_for('main.unpaid_fees'))
     except Exception as e:
         logger.error(f'Error accessing unpaid fees: {str(e)}', exc_info=True)
         flash('Error loading unpaid fees', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.dashboard'))
 
-@app.route('/generate_student_report/<int:student_id>')
+def _render_student_report(student, fees, buffer):
+    # ReportLab is only imported once a report is actually requested
+    from report_generator import generate_student_report
+    with report_timer('student'):
+        generate_student_report(student, fees, buffer)
+
+@bp.route('/generate_student_report/<int:student_id>')
 def generate_student_report_route(student_id):
     try:
         student = Student.query.get_or_404(student_id)
-        fees = Fee.query.filter_by(student_id=student_id).order_by(Fee.month).all()
-        
-        # Create reports directory if it doesn't exist
-        os.makedirs('reports', exist_ok=True)
-        
-        # Generate filename with timestamp to avoid conflicts
-        filename = f'reports/student_{student.seat_number}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        # Generate the report
-        generate_student_report(student, fees, filename)
+        history = fee_history(student_id=student_id)
+        fees = db.session.execute(db.select(history).order_by(history.c.month)).all()
+
+        version = data_version(
+            (student.name, student.seat_number, student.phone_number,
+             student.joining_date, student.monthly_fee),
+            *[(fee.id, fee.month, fee.amount, fee.paid, fee.payment_date) for fee in fees]
+        )
+        response = report_cache.serve(
+            f'student_{student.id}', version,
+            partial(_render_student_report, student, fees),
+            download_name=f'student_report_{student.name}.pdf'
+        )
         
         logger.info(f'Generated student report for: {student.name} (ID: {student_id})')
-        return send_file(filename, as_attachment=True, download_name=f'student_report_{student.name}.pdf')
+        return response
     except Exception as e:
         logger.error(f'Error generating student report: {str(e)}', exc_info=True)
         flash(f'Error generating report: {str(e)}', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
+
+def _monthly_report_rows(target_date):
+    """Plain (fee_id, amount, paid, payment_date, name, seat_number) rows for a
+    month, live or archived"""
+    fees = fee_history(month=target_date)
+    rows = db.session.query(
+            fees.c.id, fees.c.amount, fees.c.paid, fees.c.payment_date,
+            Student.name, Student.seat_number
+        )\
+        .join(Student, fees.c.student_id == Student.id)\
+        .order_by(Student.name)\
+        .all()
+    return [tuple(row) for row in rows]
 
-@app.route('/generate_monthly_report/<int:year>/<int:month>')
+def _monthly_report_summary(target_date):
+    """Report totals for a month from its rollup row, or None if there is none"""
+    rollup = db.session.get(MonthlyRollup, target_date)
+    if rollup is None:
+        return None
+    return {
+        'total_amount': rollup.billed_amount,
+        'paid_amount': rollup.collected_amount,
+        'unpaid_amount': rollup.outstanding_amount,
+        'paid_count': rollup.paid_count,
+        'unpaid_count': rollup.unpaid_count,
+    }
+
+def _render_monthly_report(rows, target_date, summary, buffer):
+    with report_timer('monthly'):
+        buffer.write(render_monthly_report(rows, target_date, summary))
+
+def _finish_report_job(app, job_id, submitted, future):
+    """Pool callback: store the rendered PDF and mark the job done or failed"""
+    observe_report('monthly', 'job', time.perf_counter() - submitted)
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        if job is None:
+            return
+        try:
+            report_cache.put(job.report_key, job.version, future.result())
+            job.status = 'done'
+            logger.info(f'Report job {job_id} finished')
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f'Report job {job_id} failed: {str(e)}', exc_info=True)
+        job.finished_at = datetime.now()
+        db.session.commit()
+
+def submit_monthly_report_job(target_date, rows, summary=None):
+    """Queue a monthly report render, reusing a pending or finished job for
+    the same month and data"""
+    key = f'monthly_{target_date.strftime("%Y%m")}'
+    version = data_version(*rows)
+    job_id = f'{key}_{version}'
+
+    job = db.session.get(ReportJob, job_id)
+    cached = report_cache.get(key, version) is not None
+    if job is not None:
+        if job.status == 'done' and cached:
+            return job
+        if job.status == 'pending' and job.created_at > datetime.now() - REPORT_JOB_TIMEOUT:
+            return job
+    else:
+        job = ReportJob(
+            id=job_id,
+            report_key=key,
+            version=version,
+            download_name=f'monthly_report_{target_date.strftime("%B_%Y")}.pdf'
+        )
+        db.session.add(job)
+
+    job.status = 'done' if cached else 'pending'
+    job.error = None
+    job.created_at = datetime.now()
+    job.finished_at = job.created_at if cached else None
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker queued the same report first
+        db.session.rollback()
+        return db.session.get(ReportJob, job_id)
+
+    if not cached:
+        report_pool.submit(render_monthly_report, rows, target_date, summary,
+                           on_done=partial(_finish_report_job, current_app._get_current_object(),
+                                           job_id, time.perf_counter()))
+        logger.info(f'Queued report job {job_id} ({len(rows)} rows)')
+    return job
+
+def _report_job_json(job):
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('main.report_job_status', job_id=job.id),
+        'download_url': url_for('main.download_report_job', job_id=job.id) if job.status == 'done' else None
+    }
+
+@bp.route('/generate_monthly_report/<int:year>/<int:month>')
 def generate_monthly_report_route(year, month):
     try:
         # Get all fees for the specified month
         target_date = datetime(year, month, 1).date()
-        fees = db.session.query(Fee, Student)\
-            .join(Student)\
-            .filter(Fee.month == target_date)\
-            .order_by(Student.name)\
-            .all()
-            
-        # Create reports directory if it doesn't exist
-        os.makedirs('reports', exist_ok=True)
-        
-        # Generate filename with timestamp to avoid conflicts
-        filename = f'reports/monthly_report_{target_date.strftime("%Y%m")}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        # Generate the report
-        generate_monthly_report(fees, target_date, filename)
+        rows = _monthly_report_rows(target_date)
+        summary = _monthly_report_summary(target_date)
+
+        # Large months are rendered by the report pool; the page polls for it
+        if len(rows) > REPORT_ASYNC_ROWS:
+            job = submit_monthly_report_job(target_date, rows, summary)
+            return render_template('report_job.html', job=_report_job_json(job),
+                                   title=f'Monthly Fee Report - {target_date.strftime("%B %Y")}')
+
+        response = report_cache.serve(
+            f'monthly_{target_date.strftime("%Y%m")}', data_version(*rows),
+            partial(_render_monthly_report, rows, target_date, summary),
+            download_name=f'monthly_report_{target_date.strftime("%B_%Y")}.pdf'
+        )
         
         logger.info(f'Generated monthly report for: {target_date.strftime("%B %Y")}')
-        return send_file(filename, as_attachment=True, download_name=f'monthly_report_{target_date.strftime("%B_%Y")}.pdf')
+        return response
     except Exception as e:
         logger.error(f'Error generating monthly report: {str(e)}', exc_info=True)
         flash(f'Error generating report: {str(e)}', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-@app.errorhandler(404)
+@bp.route('/report_jobs/monthly/<int:year>/<int:month>', methods=['POST'])
+def submit_monthly_report_route(year, month):
+    try:
+        target_date = date(year, month, 1)
+    except ValueError:
+        return jsonify({'error': 'Invalid month'}), 400
+    try:
+        job = submit_monthly_report_job(target_date, _monthly_report_rows(target_date),
+                                        _monthly_report_summary(target_date))
+        return jsonify(_report_job_json(job)), 202
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error submitting monthly report job: {str(e)}', exc_info=True)
+        return jsonify({'error': 'Could not queue report'}), 500
+
+@bp.route('/report_jobs/<job_id>')
+def report_job_status(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    return jsonify(_report_job_json(job))
+
+@bp.route('/report_jobs/<job_id>/download')
+def download_report_job(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    if job.status != 'done':
+        return jsonify(_report_job_json(job)), 409
+    response = report_cache.send_cached(job.report_key, job.version, job.download_name)
+    if response is None:
+        return jsonify({'error': 'Report expired from the cache, submit it again'}), 410
+    return response
+
+@bp.route('/export/students.csv')
+def export_students():
+    statement = db.select(
+            Student.id, Student.name, Student.seat_number, Student.phone_number,
+            Student.joining_date, Student.monthly_fee
+        )\
+        .order_by(Student.id)
+    without_statement_timeout(db.session)
+    logger.info('Student export started')
+    return stream_query_csv(
+        db.session, statement,
+        ['student_id', 'name', 'seat_number', 'phone_number', 'joining_date', 'monthly_fee'],
+        'students.csv'
+    )
+
+def _fee_export_statement(fees):
+    """Export rows from ``fees``, a ``fee_history()`` selectable"""
+    return db.select(
+            fees.c.id, fees.c.month, Student.id, Student.name, Student.seat_number,
+            fees.c.amount, fees.c.paid, fees.c.payment_date
+        )\
+        .join(Student, fees.c.student_id == Student.id)
+
+FEE_EXPORT_HEADER = ['fee_id', 'month', 'student_id', 'name', 'seat_number',
+                     'amount', 'paid', 'payment_date']
+
+@bp.route('/export/fees/<int:year>/<int:month>.csv')
+def export_monthly_fees(year, month):
+    try:
+        target_date = date(year, month, 1)
+    except ValueError:
+        flash('Invalid month', 'error')
+        return redirect(url_for('main.dashboard'))
+    fees = fee_history(month=target_date)
+    statement = _fee_export_statement(fees)\
+        .order_by(Student.name, fees.c.id)
+    without_statement_timeout(db.session)
+    logger.info(f'Fee export started for {target_date.strftime("%B %Y")}')
+    return stream_query_csv(db.session, statement, FEE_EXPORT_HEADER,
+                            f'fees_{target_date.strftime("%Y_%m")}.csv')
+
+@bp.route('/export/ledger.csv')
+def export_ledger():
+    # Full fee history, live and archived, in (month, id) order
+    fees = fee_history()
+    statement = _fee_export_statement(fees).order_by(fees.c.month, fees.c.id)
+    without_statement_timeout(db.session)
+    logger.info('Ledger export started')
+    return stream_query_csv(db.session, statement, FEE_EXPORT_HEADER, 'fee_ledger.csv')
+
+def _current_month():
+    today = datetime.now().date()
+    return today, today.replace(day=1)
+
+@bp.route('/api/analytics/arrears')
+def analytics_arrears():
+    """Students owing for past or current months, largest balance first"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    min_months = request.args.get('min_months', 1, type=int)
+    today, current_month = _current_month()
+
+    with latency_budget('arrears') as timing:
+        owed = db.func.sum(Fee.amount)
+        months_outstanding = db.func.count(Fee.id)
+        rows = db.session.query(
+                Student.id, Student.name, Student.seat_number, Student.phone_number,
+                owed.label('owed'),
+                months_outstanding.label('months'),
+                db.func.min(Fee.month).label('oldest_month'),
+                # Window aggregates over the grouped rows give the totals
+                # for every student in arrears in the same query
+                db.func.count().over().label('students_in_arrears'),
+                db.func.sum(owed).over().label('total_owed')
+            )\
+            .join(Student, Fee.student_id == Student.id)\
+            .filter(Fee.paid == False, Fee.month <= current_month)\
+            .group_by(Student.id, Student.name, Student.seat_number, Student.phone_number)\
+            .having(months_outstanding >= min_months)\
+            .order_by(owed.desc(), Student.id)\
+            .limit(limit)\
+            .all()
+
+    students = [{
+        'student_id': row.id,
+        'name': row.name,
+        'seat_number': row.seat_number,
+        'phone_number': row.phone_number,
+        'owed': round(row.owed, 2),
+        'months_outstanding': row.months,
+        'oldest_month': row.oldest_month.strftime('%Y-%m'),
+    } for row in rows]
+    return jsonify({
+        'as_of': today.isoformat(),
+        'students_in_arrears': rows[0].students_in_arrears if rows else 0,
+        'total_owed': round(rows[0].total_owed, 2) if rows else 0,
+        'students': students,
+        'elapsed_ms': timing['elapsed_ms'],
+    })
+
+@bp.route('/api/analytics/aging')
+def analytics_aging():
+    """Unpaid fees grouped by how long they have been due"""
+    today, current_month = _current_month()
+
+    with latency_budget('aging') as timing:
+        cutoffs = aging_cutoffs(today)
+        bucket = db.case(
+            *[(Fee.month >= oldest, label) for label, oldest, _ in cutoffs if oldest is not None],
+            else_=cutoffs[-1][0]
+        ).label('bucket')
+        rows = db.session.query(
+                bucket,
+                db.func.sum(Fee.amount),
+                db.func.count(Fee.id),
+                db.func.count(db.distinct(Fee.student_id))
+            )\
+            .filter(Fee.paid == False, Fee.month <= today)\
+            .group_by(bucket)\
+            .all()
+
+    return jsonify({
+        'as_of': today.isoformat(),
+        'buckets': aging_report(rows),
+        'elapsed_ms': timing['elapsed_ms'],
+    })
+
+@bp.route('/api/analytics/collections')
+def analytics_collections():
+    """Month-over-month billing and collection trend from the monthly rollup"""
+    months = min(max(request.args.get('months', 12, type=int), 1), 120)
+    today, current_month = _current_month()
+    start = current_month - relativedelta(months=months - 1)
+
+    with latency_budget('collections') as timing:
+        rows = db.session.query(
+                MonthlyRollup.month,
+                MonthlyRollup.billed_amount,
+                MonthlyRollup.collected_amount,
+                MonthlyRollup.outstanding_amount,
+                MonthlyRollup.received_amount
+            )\
+            .filter(MonthlyRollup.month >= start, MonthlyRollup.month <= current_month)\
+            .all()
+        trend = collection_trend(rows, start, current_month)
+
+    return jsonify({
+        'as_of': today.isoformat(),
+        'months': trend,
+        'elapsed_ms': timing['elapsed_ms'],
+    })
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     logger.warning(f'Page not found: {request.url}')
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     logger.error(f'Server Error: {str(error)}', exc_info=True)
     return render_template('500.html'), 500
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=True)
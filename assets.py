@@ -0,0 +1,159 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+import posixpath
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without it
+    brotli = None
+
+logger = logging.getLogger('fee_manager')
+
+# Built assets live in static/dist, named <name>.<hash><ext>
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Fingerprinted names change with the content, so they never need revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.ttf', '.html')
+# Keep a compressed variant only if it saves at least this much
+MIN_SAVING = 0.9
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _fingerprint(path, content):
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _rewrite_css(path, content, manifest):
+    """Point relative url() references in a stylesheet at fingerprinted files"""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target_path, _, suffix = target.partition('?')
+        target_path, hash_sep, fragment = target_path.partition('#')
+        resolved = posixpath.normpath(posixpath.join(base, target_path))
+        if resolved not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[resolved], base)
+        rest = (f'?{suffix}' if suffix else '') + (f'#{fragment}' if hash_sep else '')
+        return f'url({quote}{hashed}{rest}{quote})'
+
+    return _CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write_variants(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    if not path.endswith(COMPRESSIBLE):
+        return
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content) * MIN_SAVING:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def build_assets(static_folder):
+    """Copy every file under ``static_folder`` into its dist directory under a
+    content-hashed name, with gzip (and brotli, if installed) variants, and
+    write the manifest mapping source paths to built ones.
+
+    Stylesheets are built after the files they reference so their url()s
+    can be rewritten to the hashed names. Returns the manifest.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    sources = []
+    for directory, dirs, files in os.walk(static_folder):
+        if directory == static_folder:
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        for name in files:
+            full_path = os.path.join(directory, name)
+            sources.append(os.path.relpath(full_path, static_folder).replace(os.sep, '/'))
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content, manifest)
+        hashed = _fingerprint(path, content)
+        target = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_variants(target, content)
+        manifest[path] = hashed
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    logger.info(f'Built {len(manifest)} static asset(s) into {dist}'
+                + ('' if brotli is not None else ' (brotli not installed, gzip only)'))
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def init_assets(app):
+    """Add the ``asset_url`` template helper and serve built assets with
+    immutable cache headers and precompressed bodies.
+
+    Without a built manifest ('flask --app app build-assets') the helper
+    falls back to the plain static files, as in development.
+    """
+    manifest = load_manifest(app.static_folder)
+    if manifest is None:
+        logger.info('No static asset manifest; serving unhashed static files')
+    app.extensions['asset_manifest'] = manifest
+
+    def asset_url(path):
+        """URL of a static file, fingerprinted if the assets are built"""
+        manifest = app.extensions['asset_manifest']
+        if manifest and path in manifest:
+            return url_for('static', filename=f'{DIST_DIR}/{manifest[path]}')
+        return url_for('static', filename=path)
+
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    def static(filename):
+        if not filename.startswith(f'{DIST_DIR}/'):
+            return app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] and \
+                    os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(app.static_folder, filename + suffix,
+                                               mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, filename,
+                                           mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
@@ -0,0 +1,93 @@
+"""Check that the dashboard runs a fixed number of SQL statements.
+
+Seeds a throwaway SQLite database at several roster sizes and counts the
+statements issued by ``GET /``. Exits non-zero if the count grows with the
+roster or exceeds the budget. tests/test_dashboard_queries.py runs the same
+check under pytest.
+
+    python benchmarks/dashboard_queries.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from app import create_app, db, fragment_cache, Student, generate_fees_for_all_students  # noqa: E402
+
+DASHBOARD_QUERY_BUDGET = 6
+ROSTER_SIZES = (10, 100, 1000)
+
+
+def make_app(directory):
+    """App on a fresh SQLite database in ``directory``"""
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "bench.db")}',
+        'FEE_SCHEDULER': False,
+    })
+
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    # The data version restarts with the tables; drop fragments rendered
+    # for the previous roster
+    fragment_cache.invalidate()
+    db.session.execute(db.insert(Student), [
+        {
+            'name': f'Student {i:05d}',
+            'seat_number': f'S{i:05d}',
+            'joining_date': date(2024, 1, 1),
+            'monthly_fee': 1000.0,
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+    generate_fees_for_all_students()
+
+
+def count_dashboard_queries(app):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        response = app.test_client().get('/')
+        assert response.status_code == 200, response.status_code
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+    return len(statements)
+
+
+def dashboard_query_counts(app, sizes=ROSTER_SIZES):
+    """{roster size: statements issued by one dashboard load}"""
+    results = {}
+    with app.app_context():
+        for size in sizes:
+            seed(size)
+            results[size] = count_dashboard_queries(app)
+    return results
+
+
+def main():
+    results = dashboard_query_counts(make_app(tempfile.mkdtemp()))
+    for size, count in results.items():
+        print(f'{size:>6} students: {count} queries')
+
+    counts = set(results.values())
+    if len(counts) != 1:
+        print('FAIL: dashboard query count grows with the roster')
+        return 1
+    if counts.pop() > DASHBOARD_QUERY_BUDGET:
+        print(f'FAIL: dashboard exceeds its budget of {DASHBOARD_QUERY_BUDGET} queries')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
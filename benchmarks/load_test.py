@@ -0,0 +1,383 @@
+"""Latency, queries per request and peak memory of the main routes at
+several roster sizes.
+
+Each size gets a throwaway SQLite database seeded by seed_data.py. The
+routes are then driven through the Flask test client in a fresh process
+(so peak RSS is per size), or with --gunicorn through a local gunicorn
+started with gunicorn_config.py. Save results with --json and compare a
+later run against them with --compare.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sizes 1000 10000 --json before.json
+    python benchmarks/load_test.py --compare before.json --fail-over 20
+    python benchmarks/load_test.py --gunicorn --workers 2 --concurrency 8
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import signal
+import argparse
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_SCRIPT = os.path.join(ROOT, 'benchmarks', 'seed_data.py')
+
+DEFAULT_SIZES = (100, 1000, 5000)
+
+# (name, endpoint, method); endpoints match the labels on /metrics
+ROUTES = (
+    ('dashboard', 'main.dashboard', 'GET'),
+    ('unpaid_fees', 'main.unpaid_fees', 'GET'),
+    ('student_details', 'main.student_details', 'GET'),
+    ('add_fee', 'main.add_fee', 'POST'),
+    ('student_report', 'main.generate_student_report_route', 'GET'),
+    ('monthly_report', 'main.generate_monthly_report_route', 'GET'),
+)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def request_for(name, students, rng, today):
+    """(path, form data) for one request to the named route"""
+    student_id = rng.randint(1, students)
+    if name == 'dashboard':
+        return '/', None
+    if name == 'unpaid_fees':
+        return '/unpaid_fees', None
+    if name == 'student_details':
+        return f'/student/{student_id}', None
+    if name == 'add_fee':
+        return f'/add_fee/{student_id}', {
+            'month': today.strftime('%Y-%m'),
+            'paid': 'True',
+            'payment_date': today.isoformat(),
+            'amount': '1000',
+        }
+    if name == 'student_report':
+        return f'/generate_student_report/{student_id}', None
+    return f'/generate_monthly_report/{today.year}/{today.month}', None
+
+
+def summarize(name, timings, first, queries, statuses, content_types):
+    """Per-route statistics; ``timings`` in seconds, excluding the first request"""
+    ms = [t * 1000 for t in timings]
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {
+        'route': name,
+        'requests': len(ms),
+        'first_ms': round(first * 1000, 1) if first is not None else None,
+        'mean_ms': round(statistics.fmean(ms), 1),
+        'p50_ms': round(cuts[49], 1),
+        'p95_ms': round(cuts[94], 1),
+        'p99_ms': round(cuts[98], 1),
+        'queries_per_request': round(queries, 1) if queries is not None else None,
+        'statuses': dict(Counter(str(s) for s in statuses)),
+        'content_types': dict(Counter(content_types)),
+    }
+
+
+def run_test_client(students, iterations, seed):
+    """Drive every route through the test client; runs in its own process"""
+    sys.path.insert(0, ROOT)
+    from flask import request
+    from app import create_app, report_pool
+    from query_counter import get_query_count
+
+    app = create_app()
+    counts = []
+
+    @app.after_request
+    def count_queries(response):
+        if request.path != '/metrics':
+            counts.append(get_query_count())
+        return response
+
+    client = app.test_client()
+    rng = random.Random(seed)
+    today = date.today()
+    baseline = peak_rss_mb()
+    routes = []
+    for name, _, method in ROUTES:
+        timings, statuses, content_types = [], [], []
+        first = None
+        del counts[:]
+        for i in range(iterations + 1):
+            path, data = request_for(name, students, rng, today)
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            if i == 0:
+                first = elapsed
+            else:
+                timings.append(elapsed)
+            statuses.append(response.status_code)
+            content_types.append(response.mimetype)
+        result = summarize(name, timings, first, statistics.fmean(counts), statuses, content_types)
+        result['rss_high_water_mb'] = round(peak_rss_mb(), 1)
+        routes.append(result)
+
+    report_pool.shutdown()
+    return {
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'routes': routes,
+    }
+
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def scrape(base_url):
+    """{(metric, frozenset(labels)): value} from /metrics"""
+    with urllib.request.urlopen(f'{base_url}/metrics', timeout=10) as response:
+        text = response.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, frozenset(_LABEL.findall(labels)))] = float(value)
+    return samples
+
+
+def endpoint_total(samples, metric, endpoint):
+    return sum(value for (name, labels), value in samples.items()
+               if name == metric and ('endpoint', endpoint) in labels)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time the route itself, not the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def worker_peak_rss_mb(master_pid):
+    """VmHWM of each gunicorn worker (Linux only)"""
+    peaks = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        if status.get('PPid', '').strip() == str(master_pid) and 'VmHWM' in status:
+            peaks.append(round(int(status['VmHWM'].split()[0]) / 1024, 1))
+    return peaks
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(students, iterations, seed, env, workdir, workers, concurrency):
+    """Drive every route over HTTP against a local gunicorn"""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               METRICS_DIR=os.path.join(workdir, 'metrics'))
+    log = open(os.path.join(workdir, 'gunicorn.log'), 'w')
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn_config.py', 'app:create_app()'],
+                              cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                scrape(base_url)
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'gunicorn did not start; see {log.name}')
+                time.sleep(0.2)
+
+        opener = urllib.request.build_opener(_NoRedirect)
+        rng = random.Random(seed)
+        today = date.today()
+
+        def fetch(path, data):
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+            start = time.perf_counter()
+            try:
+                with opener.open(f'{base_url}{path}', data=body, timeout=120) as response:
+                    response.read()
+                    status, content_type = response.status, response.headers.get_content_type()
+            except urllib.error.HTTPError as e:
+                status, content_type = e.code, e.headers.get_content_type()
+            return time.perf_counter() - start, status, content_type
+
+        routes = []
+        with ThreadPoolExecutor(concurrency) as pool:
+            for name, endpoint, _ in ROUTES:
+                before = scrape(base_url)
+                first = fetch(*request_for(name, students, rng, today))
+                requests = [request_for(name, students, rng, today) for _ in range(iterations)]
+                results = list(pool.map(lambda args: fetch(*args), requests))
+                # Workers write their metrics snapshots about once a second
+                time.sleep(1.5)
+                after = scrape(base_url)
+                served = endpoint_total(after, 'fee_manager_http_requests_total', endpoint) \
+                    - endpoint_total(before, 'fee_manager_http_requests_total', endpoint)
+                statements = endpoint_total(after, 'fee_manager_sql_statements_total', endpoint) \
+                    - endpoint_total(before, 'fee_manager_sql_statements_total', endpoint)
+                results.insert(0, first)
+                routes.append(summarize(
+                    name, [r[0] for r in results[1:]], first[0],
+                    statements / served if served else None,
+                    [r[1] for r in results], [r[2] for r in results]
+                ))
+
+        peaks = worker_peak_rss_mb(server.pid)
+        return {
+            'workers': workers,
+            'concurrency': concurrency,
+            'peak_rss_mb': max(peaks) if peaks else None,
+            'worker_peak_rss_mb': peaks,
+            'routes': routes,
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+
+def run_size(students, args):
+    workdir = tempfile.mkdtemp(prefix='fee_load_')
+    try:
+        env = dict(os.environ,
+                   DATABASE_URL=f'sqlite:///{os.path.join(workdir, "load.db")}',
+                   FEE_SCHEDULER='0',
+                   LOG_DIR=os.path.join(workdir, 'logs'),
+                   REPORTS_DIR=os.path.join(workdir, 'reports'))
+        env.pop('METRICS_DIR', None)
+        seed_start = time.perf_counter()
+        seeded = subprocess.run([sys.executable, SEED_SCRIPT, '--students', str(students),
+                                 '--months', str(args.months), '--seed', str(args.seed)],
+                                env=env, check=True, capture_output=True, text=True).stdout
+        print(f'  {seeded.strip()} ({time.perf_counter() - seed_start:.1f}s)')
+
+        if args.gunicorn:
+            result = run_gunicorn(students, args.iterations, args.seed, env, workdir,
+                                  args.workers, args.concurrency)
+        else:
+            out = subprocess.run([sys.executable, __file__, '--child', str(students),
+                                  '--iterations', str(args.iterations), '--seed', str(args.seed)],
+                                 env=env, check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+        return dict(students=students, months=args.months,
+                    mode='gunicorn' if args.gunicorn else 'test_client', **result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_result(result):
+    print(f'{result["students"]} students, {result["mode"]}, peak RSS {result["peak_rss_mb"]} MB')
+    print(f'  {"route":<16} {"first":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"q/req":>6}  statuses')
+    for route in result['routes']:
+        queries = route['queries_per_request']
+        print(f'  {route["route"]:<16} {route["first_ms"]:>8} {route["p50_ms"]:>8} '
+              f'{route["p95_ms"]:>8} {route["p99_ms"]:>8} '
+              f'{"-" if queries is None else queries:>6}  '
+              f'{" ".join(f"{k}x{v}" for k, v in sorted(route["statuses"].items()))}')
+
+
+def compare(results, baseline_path, fail_over):
+    """Print the change against a saved run; return True if any route's p95
+    grew by more than ``fail_over`` percent or it issues more queries"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['mode'], r['students'], route['route']): route
+                for r in baseline['results'] for route in r['routes']}
+    regressed = False
+    print(f'Compared with {baseline_path}:')
+    for result in results:
+        for route in result['routes']:
+            old = previous.get((result['mode'], result['students'], route['route']))
+            if old is None:
+                continue
+            change = (route['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            queries_up = (route['queries_per_request'] or 0) > (old['queries_per_request'] or 0)
+            flag = ''
+            if (fail_over is not None and change > fail_over) or queries_up:
+                flag = '  REGRESSION'
+                regressed = True
+            print(f'  {result["students"]:>6} {route["route"]:<16} p95 {old["p95_ms"]} -> '
+                  f'{route["p95_ms"]} ms ({change:+.0f}%), queries '
+                  f'{old["queries_per_request"]} -> {route["queries_per_request"]}{flag}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='roster sizes')
+    parser.add_argument('--months', type=int, default=12, help='months of fee history')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per route')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--gunicorn', action='store_true', help='drive a local gunicorn over HTTP')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients for --gunicorn')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='results file from an earlier run')
+    parser.add_argument('--fail-over', type=float,
+                        help='with --compare, exit non-zero if a p95 grows by more than this percent')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_test_client(args.child, args.iterations, args.seed)))
+        return 0
+
+    results = []
+    for students in args.sizes:
+        print(f'Seeding {students} students x {args.months} months')
+        result = run_size(students, args)
+        results.append(result)
+        print_result(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'meta': {
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'date': date.today().isoformat(),
+                    'iterations': args.iterations,
+                    'months': args.months,
+                    'seed': args.seed,
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare and compare(results, args.compare, args.fail_over):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Render time and peak memory of the PDF report generator.
+
+Each size is rendered in a fresh process so that peak RSS (ru_maxrss) is
+measured per size rather than as the high-water mark of the whole run.
+
+    python benchmarks/report_rendering.py
+    python benchmarks/report_rendering.py --rows 1000 10000 50000 --json results.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+from collections import namedtuple
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_ROWS = (1000, 10000, 50000)
+
+FeeRow = namedtuple('FeeRow', ['amount', 'paid', 'payment_date', 'month'])
+StudentRow = namedtuple('StudentRow', ['name', 'seat_number'])
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def synthetic_month(rows, seed=42):
+    rng = random.Random(seed)
+    target = date(2024, 5, 1)
+    data = []
+    for i in range(rows):
+        paid = rng.random() < 0.7
+        data.append((
+            FeeRow(1000.0 + rng.randrange(0, 500, 50), paid, date(2024, 5, rng.randint(1, 28)) if paid else None, target),
+            StudentRow(f'Student {i:06d}', f'S{i:06d}')
+        ))
+    return data, target
+
+
+def run_one(rows):
+    import report_generator
+
+    data, target = synthetic_month(rows)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    report_generator.generate_monthly_report(data, target, buffer)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed),
+        'pdf_kb': round(len(buffer.getvalue()) / 1024),
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args.child)))
+        return 0
+
+    results = []
+    print(f'{"rows":>8} {"seconds":>8} {"rows/s":>8} {"pdf KB":>8} {"base MB":>8} {"peak MB":>8}')
+    for rows in args.rows:
+        out = subprocess.run([sys.executable, __file__, '--child', str(rows)],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        results.append(result)
+        print(f'{result["rows"]:>8} {result["seconds"]:>8} {result["rows_per_second"]:>8} '
+              f'{result["pdf_kb"]:>8} {result["baseline_rss_mb"]:>8} {result["peak_rss_mb"]:>8}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Fill a database with N students and M months of fee history.
+
+Rows go through the models in app.py, so the schema, the generation ledger
+and the monthly rollup match what the running app would have built. The
+data is deterministic for a given seed.
+
+    python benchmarks/seed_data.py --students 1000 --months 12
+    python benchmarks/seed_data.py --students 5000 --database-url sqlite:////tmp/load.db
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date
+from dateutil.relativedelta import relativedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FEE_AMOUNTS = (800.0, 1000.0, 1200.0, 1500.0)
+CHUNK_SIZE = 5000
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def generate(students, months, seed=42, today=None):
+    """Student and fee rows (as dicts) for ``students`` people who joined
+    over the last ``months`` months. Fee ids refer to student positions,
+    starting at 1."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    current = today.replace(day=1)
+    first = current - relativedelta(months=months - 1)
+
+    student_rows, fee_rows = [], []
+    for i in range(1, students + 1):
+        # Most of the roster joined in the first month; the rest trickle in
+        joined = first if rng.random() < 0.6 else first + relativedelta(months=rng.randrange(months))
+        monthly_fee = rng.choice(FEE_AMOUNTS)
+        student_rows.append({
+            'name': f'Student {i:05d}',
+            'seat_number': f'S{i:05d}',
+            'phone_number': f'9{rng.randrange(10 ** 9):09d}',
+            'joining_date': joined.replace(day=rng.randint(1, 28)),
+            'monthly_fee': monthly_fee,
+        })
+        month = joined
+        while month <= current:
+            # Older months are nearly all settled; the current one is not
+            paid = rng.random() < (0.6 if month == current else 0.95)
+            last_day = today.day if month == current else 28
+            fee_rows.append({
+                'student_id': i,
+                'amount': monthly_fee,
+                'month': month,
+                'paid': paid,
+                'payment_date': month.replace(day=rng.randint(1, last_day)) if paid else None,
+            })
+            month += relativedelta(months=1)
+    return student_rows, fee_rows
+
+
+def seed(students, months, seed=42):
+    """Replace the contents of the app's database with generated data;
+    call within an app context"""
+    from app import db, init_db, rebuild_monthly_rollups, Student, Fee, FeeGenerationLedger
+
+    db.drop_all()
+    init_db()
+    student_rows, fee_rows = generate(students, months, seed)
+    for chunk in _chunks(student_rows):
+        db.session.execute(db.insert(Student), chunk)
+    for chunk in _chunks(fee_rows):
+        db.session.execute(db.insert(Fee), chunk)
+
+    per_month = {}
+    for row in fee_rows:
+        per_month[row['month']] = per_month.get(row['month'], 0) + 1
+    if per_month:
+        db.session.execute(db.insert(FeeGenerationLedger), [
+            {'month': month, 'fee_count': count} for month, count in per_month.items()
+        ])
+    rebuild_monthly_rollups()
+    db.session.commit()
+    return len(student_rows), len(fee_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='defaults to DATABASE_URL, as for the app')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None
+    app = create_app(config)
+    start = time.perf_counter()
+    with app.app_context():
+        students, fees = seed(args.students, args.months, args.seed)
+    print(f'Seeded {students} students and {fees} fees in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Worker boot cost: import time, create_app() time and first-request latency.
+
+Each run happens in a fresh interpreter against a throwaway SQLite database
+whose schema is created beforehand (as 'flask init-db' would), so the
+numbers are what a gunicorn worker pays before serving its first request.
+Also checks that booting does not import ReportLab.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import sys, time, json
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app()
+t2 = time.perf_counter()
+reportlab_at_boot = 'reportlab' in sys.modules
+response = app.test_client().get('/')
+t3 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'total_ms': (t3 - t0) * 1000,
+    'reportlab_at_boot': reportlab_at_boot,
+}))
+'''
+
+SETUP = r'''
+import app as app_module
+app = app_module.create_app()
+with app.app_context():
+    app_module.init_db()
+'''
+
+
+def run(code, env):
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{os.path.join(tmpdir, "startup.db")}',
+               FEE_SCHEDULER='0',
+               LOG_DIR=os.path.join(tmpdir, 'logs'))
+    run(SETUP, env)
+
+    samples = [json.loads(run(PROBE, env)) for _ in range(args.runs)]
+    results = {}
+    print(f'{"":18} {"median ms":>10} {"max ms":>10}')
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [sample[key] for sample in samples]
+        results[key] = {'median': round(statistics.median(values), 1), 'max': round(max(values), 1)}
+        print(f'{key:18} {results[key]["median"]:>10.1f} {results[key]["max"]:>10.1f}')
+    results['reportlab_at_boot'] = any(sample['reportlab_at_boot'] for sample in samples)
+    print(f'ReportLab imported at boot: {"yes" if results["reportlab_at_boot"] else "no"}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if results['reportlab_at_boot']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
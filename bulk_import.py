@@ -0,0 +1,166 @@
+import csv
+import io
+from datetime import datetime
+
+# Rows written per transaction
+BATCH_SIZE = 500
+# Upper bound on rows accepted in one upload
+MAX_ROWS = 20000
+
+
+class BulkImportError(ValueError):
+    """The upload as a whole could not be read"""
+
+
+def read_rows(request):
+    """Rows from a JSON body (a list, or {"rows": [...]}), an uploaded CSV
+    file, or CSV pasted into the ``data`` form field"""
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('rows')
+        if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+            raise BulkImportError('Expected a JSON list of objects')
+        rows = payload
+    else:
+        upload = request.files.get('file')
+        if upload and upload.filename:
+            text = upload.read().decode('utf-8-sig')
+        else:
+            text = request.form.get('data', '')
+        if not text.strip():
+            raise BulkImportError('No rows provided')
+        reader = csv.DictReader(io.StringIO(text))
+        rows = [
+            {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            for row in reader
+        ]
+
+    if len(rows) > MAX_ROWS:
+        raise BulkImportError(f'Too many rows ({len(rows)}); the limit is {MAX_ROWS}')
+    return rows
+
+
+def batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _text(row, field):
+    value = row.get(field)
+    return str(value).strip() if value is not None else ''
+
+
+def _date(value, fmt, message, errors):
+    try:
+        return datetime.strptime(value, fmt).date()
+    except ValueError:
+        errors.append(message)
+        return None
+
+
+def _amount(value, label, errors):
+    try:
+        amount = float(value)
+    except ValueError:
+        errors.append(f'{label} must be a number')
+        return None
+    if amount < 0:
+        errors.append(f'{label} cannot be negative')
+        return None
+    return amount
+
+
+def validate_students(rows):
+    """Check student rows without touching the database.
+
+    Returns ``(valid, errors)``: ``valid`` is a list of ``(row_number,
+    values)`` ready for insertion and ``errors`` a list of
+    ``{'row': n, 'errors': [...]}``. Row numbers start at 1.
+    """
+    valid, errors, seen_seats = [], [], {}
+    for number, row in enumerate(rows, start=1):
+        row_errors = []
+        name = _text(row, 'name')
+        seat_number = _text(row, 'seat_number')
+        joining_date_str = _text(row, 'joining_date')
+        monthly_fee_str = _text(row, 'monthly_fee')
+
+        if not name:
+            row_errors.append('Name is required')
+        elif len(name) > 100:
+            row_errors.append('Name is longer than 100 characters')
+        if not seat_number:
+            row_errors.append('Seat number is required')
+        elif len(seat_number) > 20:
+            row_errors.append('Seat number is longer than 20 characters')
+        elif seat_number in seen_seats:
+            row_errors.append(f'Seat number {seat_number} repeats row {seen_seats[seat_number]}')
+        else:
+            seen_seats[seat_number] = number
+        phone_number = _text(row, 'phone_number') or None
+        if phone_number and len(phone_number) > 15:
+            row_errors.append('Phone number is longer than 15 characters')
+
+        joining_date = None
+        if not joining_date_str:
+            row_errors.append('Joining date is required')
+        else:
+            joining_date = _date(joining_date_str, '%Y-%m-%d', 'Joining date must be YYYY-MM-DD', row_errors)
+        monthly_fee = _amount(monthly_fee_str, 'Monthly fee', row_errors) if monthly_fee_str else 1000.0
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            valid.append((number, {
+                'name': name,
+                'seat_number': seat_number,
+                'phone_number': phone_number,
+                'joining_date': joining_date,
+                'monthly_fee': monthly_fee,
+            }))
+    return valid, errors
+
+
+def validate_fee_payments(rows, today):
+    """Check "mark paid" rows without touching the database.
+
+    Each row names a student by ``seat_number`` and a ``month`` (YYYY-MM);
+    ``payment_date`` defaults to ``today`` and ``amount`` to the existing
+    fee amount. Returns ``(valid, errors)`` like ``validate_students``.
+    """
+    valid, errors, seen = [], [], {}
+    for number, row in enumerate(rows, start=1):
+        row_errors = []
+        seat_number = _text(row, 'seat_number')
+        month_str = _text(row, 'month')
+        payment_date_str = _text(row, 'payment_date')
+        amount_str = _text(row, 'amount')
+
+        if not seat_number:
+            row_errors.append('Seat number is required')
+        month = None
+        if not month_str:
+            row_errors.append('Month is required')
+        else:
+            month = _date(month_str + '-01', '%Y-%m-%d', 'Month must be YYYY-MM', row_errors)
+        payment_date = _date(payment_date_str, '%Y-%m-%d', 'Payment date must be YYYY-MM-DD', row_errors) \
+            if payment_date_str else today
+        amount = _amount(amount_str, 'Amount', row_errors) if amount_str else None
+
+        key = (seat_number, month)
+        if seat_number and month and key in seen:
+            row_errors.append(f'Duplicate of row {seen[key]}')
+        elif seat_number and month:
+            seen[key] = number
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            valid.append((number, {
+                'seat_number': seat_number,
+                'month': month,
+                'payment_date': payment_date,
+                'amount': amount,
+            }))
+    return valid, errors
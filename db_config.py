@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+from flask import current_app, g, has_request_context
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from metrics import observe_pool_checkout
+
+logger = logging.getLogger('fee_manager')
+
+# Connections a worker needs beyond its request threads: the fee scheduler
+# and the report-job completion callback
+BACKGROUND_CONNECTIONS = 1
+
+
+def _env_int(env, name, default):
+    value = env.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def gunicorn_concurrency(env=os.environ):
+    """(workers, threads) the app is served with, from the same variables
+    and defaults as gunicorn_config.py. Importing that file would run its
+    module-level settings in every process that builds the app."""
+    return _env_int(env, 'WEB_CONCURRENCY', 4), _env_int(env, 'GUNICORN_THREADS', 2)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout takes and logs slow
+    or failed checkouts, so pool exhaustion shows up in logs and metrics"""
+
+    warn_after = 0.1
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            logger.error(f'Database pool exhausted after {time.perf_counter() - start:.2f}s: {self.status()}')
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            observe_pool_checkout(waited)
+            if waited > self.warn_after:
+                logger.warning(f'Waited {waited * 1000:.0f}ms for a database connection: {self.status()}')
+
+
+def engine_options(database_url, env=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``database_url``.
+
+    Postgres: each worker gets a pool of one connection per request thread
+    plus background threads (``DB_POOL_SIZE``), ``DB_MAX_OVERFLOW`` extra on
+    bursts and connections pre-pinged and recycled after ``DB_POOL_RECYCLE``
+    seconds; web requests get a statement timeout from
+    ``init_statement_timeout``. SQLite file databases use the same pool;
+    their PRAGMAs are set by ``init_engine_events``.
+    """
+    url = make_url(database_url)
+    workers, threads = gunicorn_concurrency(env)
+    pool_size = _env_int(env, 'DB_POOL_SIZE', threads + BACKGROUND_CONNECTIONS)
+    max_overflow = _env_int(env, 'DB_MAX_OVERFLOW', 2)
+    TimedQueuePool.warn_after = _env_int(env, 'DB_POOL_WAIT_WARN_MS', 100) / 1000
+
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # Flask-SQLAlchemy uses a single shared connection for these
+            return {}
+        return {
+            'poolclass': TimedQueuePool,
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 10),
+            # Python-side lock wait, matching PRAGMA busy_timeout
+            'connect_args': {'timeout': _env_int(env, 'SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000},
+        }
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int(env, 'DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+    if url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {
+            'connect_timeout': _env_int(env, 'DB_CONNECT_TIMEOUT', 10),
+            'application_name': 'fee_manager',
+        }
+    logger.info(
+        f'Database pool: {pool_size} + {max_overflow} overflow per worker, '
+        f'up to {workers * (pool_size + max_overflow)} connections across {workers} workers'
+    )
+    return options
+
+
+def init_engine_events(app, db):
+    """Apply SQLite PRAGMAs to every new connection.
+
+    WAL lets readers run alongside the single writer, ``busy_timeout`` makes
+    a writer wait for the lock instead of failing with "database is locked",
+    ``synchronous=NORMAL`` is durable enough under WAL with far fewer
+    fsyncs, and ``mmap_size`` serves reads from the page cache.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+
+    pragmas = (
+        ('journal_mode', 'WAL'),
+        ('busy_timeout', int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+    )
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def init_statement_timeout(app, db):
+    """Cap every Postgres statement run for a web request at
+    ``DB_STATEMENT_TIMEOUT_MS`` (30000; 0 disables it).
+
+    The limit is set with SET LOCAL as each request transaction begins, so
+    it ends with the transaction: CLI commands, the scheduler and other
+    background work run without it, and routes that legitimately run long
+    opt out with ``without_statement_timeout``.
+    """
+    app.config.setdefault('DB_STATEMENT_TIMEOUT_MS', _env_int(os.environ, 'DB_STATEMENT_TIMEOUT_MS', 30000))
+    if getattr(db.session, '_statement_timeout_hook', False):
+        return
+    db.session._statement_timeout_hook = True
+
+    @event.listens_for(db.session, 'after_begin')
+    def limit_request_statements(session, transaction, connection):
+        if connection.dialect.name != 'postgresql' or not has_request_context() \
+                or g.get('statement_timeout_exempt'):
+            return
+        timeout = current_app.config['DB_STATEMENT_TIMEOUT_MS']
+        if timeout:
+            connection.execute(text(f'SET LOCAL statement_timeout = {int(timeout)}'))
+
+
+def without_statement_timeout(session):
+    """Lift the request statement timeout for the rest of this request, for
+    routes such as full exports that scan whole tables"""
+    g.statement_timeout_exempt = True
+    # Clears a limit already set if the request's transaction has begun
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(text('SET LOCAL statement_timeout = 0'))
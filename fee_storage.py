@@ -0,0 +1,175 @@
+import logging
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import literal, text, true
+from sqlalchemy.exc import DBAPIError
+from models import db, Fee, FeeArchive
+
+logger = logging.getLogger('fee_manager')
+
+# Columns of a fee row as read through fee_history()
+HISTORY_COLUMNS = ('id', 'student_id', 'month', 'amount', 'paid', 'payment_date')
+
+
+def fee_history(student_id=None, month=None, student_ids=None):
+    """Live and archived fees as one selectable with the columns in
+    ``HISTORY_COLUMNS``, optionally for one student, several students or
+    one month.
+
+    The filters are applied to each side of the UNION ALL, so both tables
+    are read through their (student_id, month) or month indexes.
+    """
+    live = db.select(Fee.id, Fee.student_id, Fee.month, Fee.amount, Fee.paid, Fee.payment_date)
+    archived = db.select(FeeArchive.id, FeeArchive.student_id, FeeArchive.month, FeeArchive.amount,
+                         literal(True, type_=db.Boolean).label('paid'), FeeArchive.payment_date)
+    if student_id is not None:
+        live = live.where(Fee.student_id == student_id)
+        archived = archived.where(FeeArchive.student_id == student_id)
+    if student_ids is not None:
+        live = live.where(Fee.student_id.in_(student_ids))
+        archived = archived.where(FeeArchive.student_id.in_(student_ids))
+    if month is not None:
+        live = live.where(Fee.month == month)
+        archived = archived.where(FeeArchive.month == month)
+    return live.union_all(archived).subquery('fee_history')
+
+
+def archived_keys(student_ids, months):
+    """(student_id, month) pairs among these that are archived"""
+    return set(db.session.execute(
+        db.select(FeeArchive.student_id, FeeArchive.month)
+            .where(FeeArchive.student_id.in_(student_ids), FeeArchive.month.in_(months))
+    ).all())
+
+
+def archivable_months(before):
+    """Months before ``before`` that still have live fees, all of them paid"""
+    has_unpaid = db.func.sum(db.case((Fee.paid == true(), 0), else_=1))
+    return db.session.execute(
+        db.select(Fee.month)
+            .where(Fee.month < before)
+            .group_by(Fee.month)
+            .having(has_unpaid == 0)
+            .order_by(Fee.month)
+    ).scalars().all()
+
+
+def archive_month(month):
+    """Move the paid fees of ``month`` into the archive table in the current
+    transaction. Returns the number of fees moved; the caller commits.
+
+    The rows are deleted first and the archive is filled from what was
+    deleted, so a fee marked unpaid in the meantime stays live.
+    """
+    delete = db.delete(Fee).where(Fee.month == month, Fee.paid == true())\
+        .execution_options(synchronize_session=False)
+    columns = (Fee.student_id, Fee.month, Fee.id, Fee.amount, Fee.payment_date)
+    if db.engine.dialect.delete_returning:
+        rows = db.session.execute(delete.returning(*columns)).all()
+    else:
+        rows = db.session.execute(
+            db.select(*columns).where(Fee.month == month, Fee.paid == true())
+        ).all()
+        db.session.execute(delete.where(Fee.id.in_([row.id for row in rows])))
+    if rows:
+        db.session.execute(db.insert(FeeArchive), [
+            {'student_id': student_id, 'month': month, 'id': fee_id,
+             'amount': amount, 'payment_date': payment_date}
+            for student_id, month, fee_id, amount, payment_date in rows
+        ])
+    return len(rows)
+
+
+# Postgres range partitioning of the fee table by month
+
+def _partition_name(month):
+    return f'fee_y{month.year}m{month.month:02d}'
+
+
+def fee_is_partitioned():
+    """True if the fee table is a partitioned table (Postgres only)"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(
+        text("SELECT c.relkind = 'p' FROM pg_class c "
+             "WHERE c.oid = to_regclass('fee')")
+    ).scalar() or False
+
+
+def _create_partition(month, parent='fee'):
+    db.session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF {parent} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{(month + relativedelta(months=1)).isoformat()}')"
+    ))
+
+
+def ensure_fee_partitions(month, ahead=2):
+    """Create the partitions for ``month`` and the ``ahead`` months after it
+    if the fee table is partitioned, so new fees never land in the default
+    partition. Runs in the current transaction."""
+    if not fee_is_partitioned():
+        return
+    for offset in range(ahead + 1):
+        target = month + relativedelta(months=offset)
+        try:
+            with db.session.begin_nested():
+                _create_partition(target)
+        except DBAPIError as e:
+            # e.g. the default partition already holds rows for that month;
+            # they stay readable there
+            logger.error(f'Could not create fee partition for {target.strftime("%B %Y")}: {str(e)}')
+
+
+def partition_fee_table(ahead=2):
+    """Convert the fee table into one partitioned by month, with a partition
+    per month from the oldest fee to ``ahead`` months past the current one
+    and a default partition for anything else.
+
+    Runs as a single transaction that holds an exclusive lock on the fee
+    table while the rows are copied; the caller commits. Returns the number
+    of monthly partitions created.
+    """
+    if fee_is_partitioned():
+        return 0
+
+    today = date.today().replace(day=1)
+    oldest = db.session.execute(db.select(db.func.min(Fee.month))).scalar() or today
+    oldest = oldest.replace(day=1)
+    last = today + relativedelta(months=ahead)
+
+    sequence = db.session.execute(text("SELECT pg_get_serial_sequence('fee', 'id')")).scalar()
+    statements = [
+        'LOCK TABLE fee IN ACCESS EXCLUSIVE MODE',
+        # The new table reuses the id sequence, so detach it before the old
+        # table (its owner) is dropped
+        f'ALTER SEQUENCE {sequence} OWNED BY NONE' if sequence else None,
+        'CREATE TABLE fee_partitioned (LIKE fee INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        'PARTITION BY RANGE (month)',
+    ]
+    for statement in filter(None, statements):
+        db.session.execute(text(statement))
+
+    month, created = oldest, 0
+    while month <= last:
+        _create_partition(month, parent='fee_partitioned')
+        month += relativedelta(months=1)
+        created += 1
+
+    statements = [
+        'CREATE TABLE fee_default PARTITION OF fee_partitioned DEFAULT',
+        'INSERT INTO fee_partitioned SELECT * FROM fee',
+        'DROP TABLE fee',
+        'ALTER TABLE fee_partitioned RENAME TO fee',
+        # Unique constraints on a partitioned table must include the
+        # partition key
+        'ALTER TABLE fee ADD CONSTRAINT fee_pkey PRIMARY KEY (id, month)',
+        'ALTER TABLE fee ADD CONSTRAINT fee_student_id_fkey '
+        'FOREIGN KEY (student_id) REFERENCES student (id)',
+        f'ALTER SEQUENCE {sequence} OWNED BY fee.id' if sequence else None,
+    ]
+    for statement in filter(None, statements):
+        db.session.execute(text(statement))
+    # Indexes on the parent cascade to every partition
+    for index in Fee.__table__.indexes:
+        index.create(db.session.connection())
+    return created
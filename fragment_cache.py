@@ -0,0 +1,165 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+logger = logging.getLogger('fee_manager')
+
+
+class LocalBackend:
+    """In-process LRU of rendered fragments"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileBackend:
+    """Fragments as files in a directory shared by all workers"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.html')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.html'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+class SQLiteBackend:
+    """Fragments in a SQLite file shared by all workers"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS fragment '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _run(self, sql, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+
+    def get(self, key):
+        row = self._run('SELECT value FROM fragment WHERE key = ?', (key,))
+        return row[0] if row else None
+
+    def set(self, key, value):
+        self._run('INSERT OR REPLACE INTO fragment (key, value, stored_at) VALUES (?, ?, ?)',
+                  (key, value, time.time()))
+
+    def clear(self):
+        self._run('DELETE FROM fragment')
+
+
+def shared_backend(kind, path):
+    """Build the optional shared backend: 'file' (a directory) or 'sqlite'
+    (a database file); None for local-only caching"""
+    if not kind:
+        return None
+    if kind == 'file':
+        return FileBackend(path)
+    if kind == 'sqlite':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBackend(path)
+    raise ValueError(f'Unknown fragment cache backend: {kind}')
+
+
+class FragmentCache:
+    """Rendered template sections keyed by section, data version and the
+    request parameters that shape them.
+
+    A write changes the data version, so entries for older data are never
+    served; ``invalidate`` also drops them eagerly to free memory. Lookups
+    go to the local LRU first, then the shared backend if one is set.
+    """
+
+    def __init__(self, max_entries=256, shared=None):
+        self.local = LocalBackend(max_entries)
+        self.shared = shared
+
+    @staticmethod
+    def key(section, version, parts):
+        digest = hashlib.sha1(f'{section}\0{version}\0{parts!r}'.encode())
+        return f'{section}_{digest.hexdigest()[:20]}'
+
+    def get_or_render(self, section, version, parts, render):
+        """Cached HTML for the section, calling ``render()`` on a miss"""
+        key = self.key(section, version, parts)
+        html = self.local.get(key)
+        if html is None and self.shared is not None:
+            html = self._shared('get', key)
+            if html is not None:
+                self.local.set(key, html)
+        if html is None:
+            html = str(render())
+            self.local.set(key, html)
+            if self.shared is not None:
+                self._shared('set', key, html)
+        return Markup(html)
+
+    def invalidate(self):
+        self.local.clear()
+        if self.shared is not None:
+            self._shared('clear')
+
+    def _shared(self, operation, *args):
+        # The shared tier is an optimisation; fall back to rendering
+        try:
+            return getattr(self.shared, operation)(*args)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f'Fragment cache {operation} failed: {str(e)}')
+            return None
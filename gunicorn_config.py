@@ -1,10 +1,39 @@
 import os
+import glob
+import tempfile
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
-workers = 4
-threads = 2
+# The database pool size is derived from these (see db_config.py)
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
 timeout = 120
+# Import the app once in the master and fork workers from it; create_app()
+# does no database work, so nothing unsafe is inherited
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
 accesslog = '-'
 errorlog = '-'
 capture_output = True
 enable_stdio_inheritance = True
+
+
+def on_starting(server):
+    """Give workers a shared directory for /metrics aggregation, cleared of
+    snapshots from earlier runs. Workers look it up on their first request,
+    so this also reaches an app preloaded before this hook runs."""
+    metrics_dir = os.environ.setdefault('METRICS_DIR',
+                                        os.path.join(tempfile.gettempdir(), 'fee_manager_metrics'))
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def post_fork(server, worker):
+    """Drop any pooled connections a preloaded parent may have opened"""
+    if server.cfg.preload_app:
+        from models import db
+        flask_app = server.app.wsgi()
+        with flask_app.app_context():
+            db.engine.dispose(close=False)
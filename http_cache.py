@@ -0,0 +1,158 @@
+import os
+import hashlib
+import secrets
+import logging
+from datetime import date
+from flask import current_app, g, has_app_context, make_response, request, session
+from sqlalchemy import event
+from models import db, Student, Fee, FeeArchive, MonthlyRollup, DataVersion
+
+logger = logging.getLogger('fee_manager')
+
+# Writes to these tables change what the read pages show
+TRACKED_TABLES = frozenset(model.__tablename__ for model in (Student, Fee, FeeArchive, MonthlyRollup))
+
+DATA_VERSION_ID = 1
+# A second row holds a random stamp picked when the database is set up, so
+# a recreated or restored database whose counter starts over again does not
+# reuse the versions of the old one
+DATA_GENERATION_ID = 2
+
+
+def _touches_tracked(objects):
+    return any(getattr(obj, '__tablename__', None) in TRACKED_TABLES for obj in objects)
+
+
+def bump_data_version(session):
+    """Increment the data version within ``session``'s transaction"""
+    result = session.execute(
+        db.update(DataVersion)
+        .where(DataVersion.id == DATA_VERSION_ID)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(db.insert(DataVersion).values(id=DATA_VERSION_ID, version=1))
+    if has_app_context():
+        g.pop('data_version', None)
+
+
+def ensure_data_version_row():
+    """Create the version counter and generation stamp rows if missing.
+    Returns True if a new generation was stamped."""
+    created = False
+    if db.session.get(DataVersion, DATA_VERSION_ID) is None:
+        db.session.add(DataVersion(id=DATA_VERSION_ID, version=0))
+    if db.session.get(DataVersion, DATA_GENERATION_ID) is None:
+        db.session.add(DataVersion(id=DATA_GENERATION_ID, version=secrets.randbits(62)))
+        created = True
+    db.session.commit()
+    return created
+
+
+def current_data_version():
+    """The data version as ``<generation>.<counter>``, read once per request
+    in a single indexed query"""
+    if 'data_version' not in g:
+        rows = dict(db.session.execute(
+            db.select(DataVersion.id, DataVersion.version)
+                .where(DataVersion.id.in_((DATA_VERSION_ID, DATA_GENERATION_ID)))
+        ).all())
+        g.data_version = f'{rows.get(DATA_GENERATION_ID, 0):x}.{rows.get(DATA_VERSION_ID, 0)}'
+    return g.data_version
+
+
+def _source_digest(root):
+    """Digest of the app's own top-level modules and templates, so a deploy
+    invalidates ETags even when the data has not changed. Nothing else under
+    ``root`` is read: a virtualenv there would be slow to hash and would
+    change the digest on every dependency upgrade."""
+    digest = hashlib.sha1()
+    paths = [os.path.join(root, name) for name in os.listdir(root) if name.endswith('.py')]
+    templates = os.path.join(root, 'templates')
+    for directory, _, files in os.walk(templates):
+        paths.extend(os.path.join(directory, name) for name in files if name.endswith('.html'))
+    # Pages link to fingerprinted assets, so a rebuild changes them too
+    manifest = os.path.join(root, 'static', 'dist', 'manifest.json')
+    if os.path.exists(manifest):
+        paths.append(manifest)
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def init_http_cache(app):
+    """Track writes to students, fees and the rollup.
+
+    Any session transaction that inserts, updates or deletes rows in those
+    tables, through the ORM or a bulk statement, bumps ``DataVersion``
+    just before it commits, so the bump is atomic with the write.
+    """
+    app.extensions['page_etag_salt'] = _source_digest(app.root_path)
+
+    if getattr(db.session, '_data_version_tracking', False):
+        return
+    db.session._data_version_tracking = True
+
+    @event.listens_for(db.session, 'before_flush')
+    def track_flush(session, flush_context, instances):
+        if _touches_tracked(session.new) or _touches_tracked(session.dirty) \
+                or _touches_tracked(session.deleted):
+            session.info['data_changed'] = True
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def track_statement(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if getattr(table, 'name', None) in TRACKED_TABLES:
+                orm_execute_state.session.info['data_changed'] = True
+
+    @event.listens_for(db.session, 'before_commit')
+    def bump_on_commit(session):
+        # Commit flushes after this hook, so flush now to see pending writes
+        if session.new or session.dirty or session.deleted:
+            session.flush()
+        if session.info.pop('data_changed', False):
+            bump_data_version(session)
+
+    @event.listens_for(db.session, 'after_rollback')
+    def forget_changes(session):
+        session.info.pop('data_changed', None)
+
+
+def page_etag(*parts):
+    """Strong ETag for a page built from the current data version.
+
+    The date is part of it because pages show "due today" and the current
+    month.
+    """
+    digest = hashlib.sha1(current_app.extensions['page_etag_salt'].encode())
+    for part in (current_data_version(), date.today(), *parts):
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+
+def not_modified(etag):
+    """304 response when the client already has ``etag``, else None.
+
+    Pending flash messages always get a full page: they are shown once and
+    would otherwise stay queued behind the cached copy.
+    """
+    if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+        return None
+    # Weak comparison, as If-None-Match requires; nginx turns strong ETags
+    # weak when it compresses a response
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = make_response('', 304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    response = make_response(response)
+    response.set_etag(etag)
+    # Revalidate on every load; the 304 path costs one indexed read
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,5 +1,7 @@
-from app import app, db, generate_fees_for_all_students
+from app import create_app, init_db, generate_fees_for_all_students
+
+app = create_app()
 
 with app.app_context():
-    db.create_all()
+    init_db()
     generate_fees_for_all_students()
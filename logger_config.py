@@ -1,48 +1,262 @@
 import os
+import sys
+import json
+import copy
+import queue
+import atexit
+import random
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
+from flask import g, has_request_context, request
 
-def setup_logger():
-    # Create logs directory if it doesn't exist
-    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+LOGGER_NAME = 'fee_manager'
+MAX_BYTES = 1024 * 1024  # 1MB
+BACKUP_COUNT = 10
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class LockingRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that several processes can share.
+
+    Each write and rollover holds an exclusive ``flock`` on a sidecar lock
+    file, and a process reopens the log when another one has rotated it
+    away, so gunicorn workers writing the same file neither lose lines nor
+    rotate twice.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_file = None
+        self._lock_pid = None
+
+    def _process_lock(self):
+        # flock belongs to the open file, which a forked child shares with
+        # its parent, so every process opens the lock file for itself
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(f'{self.baseFilename}.lock', 'a')
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    def _reopen_if_rotated(self):
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            current = None
+        if self.stream is None or current != os.fstat(self.stream.fileno()).st_ino:
+            if self.stream is not None:
+                self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            lock_file = self._process_lock()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = self._lock_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed via ``extra``"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'pid': record.process,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRS or key.startswith('_'):
+                continue
+            if isinstance(value, dict):
+                entry.update(value)
+            else:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Tag records with the id of the Flask request that logged them"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records per level, e.g. ``{'INFO': 0.1}``.
+
+    Levels not listed, and WARNING and above, are always kept.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {
+            logging.getLevelName(level.upper()): float(rate)
+            for level, rate in rates.items()
+        }
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
 
-    # Set up logging format
-    formatter = logging.Formatter(
-        '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
-    )
+
+def parse_sample_rates(value):
+    """``"INFO=0.1,DEBUG=0.01"`` -> ``{'INFO': 0.1, 'DEBUG': 0.01}``"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            level, rate = item.split('=', 1)
+            rates[level.strip()] = float(rate)
+    return rates
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that keeps structured fields for the listener.
+
+    The stock ``prepare`` flattens the record into a formatted string; this
+    one only resolves the message and exception text, which is all that
+    has to happen on the logging thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_handlers(log_dir, log_format):
+    if log_format == 'text':
+        formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    else:
+        formatter = JsonFormatter()
 
     # Set up file handler for all logs
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'app.log'),
-        maxBytes=1024 * 1024,  # 1MB
-        backupCount=10
+    file_handler = LockingRotatingFileHandler(
+        os.path.join(log_dir, 'app.log'), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.INFO)
 
     # Set up error file handler
-    error_file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'error.log'),
-        maxBytes=1024 * 1024,  # 1MB
-        backupCount=10
+    error_file_handler = LockingRotatingFileHandler(
+        os.path.join(log_dir, 'error.log'), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT
     )
     error_file_handler.setFormatter(formatter)
     error_file_handler.setLevel(logging.ERROR)
 
     # Set up console handler
-    console_handler = logging.StreamHandler()
+    console_handler = logging.StreamHandler(sys.stderr)
     console_handler.setFormatter(formatter)
     console_handler.setLevel(logging.INFO)
 
-    # Get the logger
-    logger = logging.getLogger('fee_manager')
-    logger.setLevel(logging.INFO)
+    return file_handler, error_file_handler, console_handler
+
+
+def _start_listener(queue_handler, handlers):
+    global _listener
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_in_child(queue_handler, handlers):
+    # A forked child (e.g. gunicorn --preload) does not inherit the listener
+    # thread, and the parent's queue may have been locked mid-fork, so it
+    # gets a fresh queue and its own listener over the same handlers
+    global _listener_lock
+    _listener_lock = threading.Lock()
+    queue_handler.queue = queue.Queue(-1)
+    _start_listener(queue_handler, handlers)
+
 
-    # Add handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(error_file_handler)
-    logger.addHandler(console_handler)
+def _stop_listener():
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
 
+
+def setup_logger():
+    """Configure the ``fee_manager`` logger and return it.
+
+    Callers only enqueue records; a background listener thread does the
+    formatting and file I/O. Safe to call more than once.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    with _listener_lock:
+        if _listener is not None:
+            return logger
+
+        # Create logs directory if it doesn't exist
+        log_dir = os.environ.get('LOG_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        log_format = os.environ.get('LOG_FORMAT', 'json')
+
+        handlers = _build_handlers(log_dir, log_format)
+        queue_handler = NonBlockingQueueHandler(queue.Queue(-1))
+        queue_handler.addFilter(RequestIdFilter())
+        rates = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES'))
+        if rates:
+            queue_handler.addFilter(SamplingFilter(rates))
+
+        logger.setLevel(logging.INFO)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        _start_listener(queue_handler, handlers)
+
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=lambda: _restart_listener_in_child(queue_handler, handlers))
     return logger
+
+
+def init_request_ids(app):
+    """Give every request an id, taken from ``X-Request-ID`` when nginx or
+    a client sets one, and echo it on the response"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        if g.get('request_id'):
+            response.headers['X-Request-ID'] = g.request_id
+        return response
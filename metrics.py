@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request, template_rendered, before_render_template
+from query_counter import get_query_count, get_query_time
+
+logger = logging.getLogger('fee_manager')
+request_logger = logging.getLogger('fee_manager.requests')
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REPORT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# How often a worker with new samples writes its snapshot to the shared
+# metrics directory
+FLUSH_INTERVAL = 1.0
+
+
+class MetricsRegistry:
+    """Counters and histograms for one process.
+
+    ``define`` registers a metric family; samples are keyed by the family
+    name and a tuple of label values. Histograms store per-bucket counts
+    (the last one is +Inf) followed by the sum, and are made cumulative
+    only when rendered.
+    """
+
+    def __init__(self):
+        self.families = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def define(self, name, kind, help_text, labels, buckets=None):
+        self.families[name] = {'kind': kind, 'help': help_text, 'labels': labels, 'buckets': buckets}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = self.families[name]['buckets']
+        key = (name, labels)
+        with self._lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(buckets) + 2)
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            sample[index] += 1
+            sample[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                [name, list(labels), list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self.samples.items()
+            ]
+
+
+def merge_snapshots(snapshots):
+    """Sum samples from several process snapshots into ``{(name, labels): value}``"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            key = (name, tuple(labels))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                if len(current) == len(value):
+                    merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_text(families, samples):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, family in families.items():
+        series = sorted((labels, value) for (sample_name, labels), value in samples.items()
+                        if sample_name == name)
+        lines.append(f'# HELP {name} {family["help"]}')
+        lines.append(f'# TYPE {name} {family["kind"]}')
+        for labels, value in series:
+            if family['kind'] == 'histogram':
+                cumulative = 0
+                bounds = [str(bound) for bound in family['buckets']] + ['+Inf']
+                for bound, count in zip(bounds, value[:-1]):
+                    cumulative += count
+                    label_text = _label_text(family['labels'], labels, [('le', bound)])
+                    lines.append(f'{name}_bucket{label_text} {cumulative}')
+                label_text = _label_text(family['labels'], labels)
+                lines.append(f'{name}_sum{label_text} {value[-1]}')
+                lines.append(f'{name}_count{label_text} {cumulative}')
+            else:
+                lines.append(f'{name}{_label_text(family["labels"], labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+registry.define('fee_manager_http_requests_total', 'counter',
+                'HTTP requests by endpoint, method and status.', ('endpoint', 'method', 'status'))
+registry.define('fee_manager_http_request_duration_seconds', 'histogram',
+                'Time to produce a response, excluding streamed bodies.', ('endpoint', 'method'),
+                LATENCY_BUCKETS)
+registry.define('fee_manager_sql_statements_total', 'counter',
+                'SQL statements executed while handling requests.', ('endpoint',))
+registry.define('fee_manager_sql_statements_per_request', 'histogram',
+                'SQL statements executed per request.', ('endpoint',), SQL_COUNT_BUCKETS)
+registry.define('fee_manager_sql_duration_seconds', 'histogram',
+                'Time spent executing SQL per request.', ('endpoint',), LATENCY_BUCKETS)
+registry.define('fee_manager_template_render_seconds', 'histogram',
+                'Jinja template render time.', ('template',), LATENCY_BUCKETS)
+registry.define('fee_manager_report_render_seconds', 'histogram',
+                'PDF report render time; for background jobs, from submit to completion.',
+                ('report', 'mode'), REPORT_BUCKETS)
+registry.define('fee_manager_db_pool_checkout_seconds', 'histogram',
+                'Time to check a connection out of the database pool.', (), LATENCY_BUCKETS)
+
+
+@contextmanager
+def report_timer(report, mode='inline'):
+    """Record how long the enclosed report render takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_report(report, mode, time.perf_counter() - start)
+
+
+def observe_report(report, mode, seconds):
+    registry.observe('fee_manager_report_render_seconds', (report, mode), seconds)
+    if has_request_context():
+        g.report_time = g.get('report_time', 0.0) + seconds
+
+
+def observe_pool_checkout(seconds):
+    registry.observe('fee_manager_db_pool_checkout_seconds', (), seconds)
+
+
+class SnapshotStore:
+    """Per-process snapshot files in a directory shared by all gunicorn
+    workers, so ``/metrics`` can report totals whichever worker serves it.
+
+    Files of exited workers are kept: their counts still belong in the
+    totals. Clear the directory when the master starts (see
+    gunicorn_config.py).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._dirty = False
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self):
+        # Looked up on every write so a forked process gets its own file
+        return os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+
+    def mark_dirty(self):
+        """Note new samples; a writer thread in this process saves them
+        within FLUSH_INTERVAL, off the request path"""
+        self._dirty = True
+        if self._writer_pid != os.getpid():
+            with self._lock:
+                if self._writer_pid != os.getpid():
+                    self._writer_pid = os.getpid()
+                    threading.Thread(target=self._write_loop, name='metrics-writer', daemon=True).start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self._dirty = False
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f'Could not write metrics snapshot: {str(e)}')
+
+    def flush(self):
+        with self._lock:
+            path = self.path
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(registry.snapshot(), f)
+            os.replace(tmp_path, path)
+
+    def collect(self):
+        own = self.path
+        snapshots = [registry.snapshot()]
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.json') or path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or mid-replace; it will be complete next scrape
+                continue
+        return merge_snapshots(snapshots)
+
+
+def init_metrics(app):
+    """Record per-request latency, SQL and template timings, log one
+    structured line per request and serve ``/metrics``.
+
+    With ``METRICS_DIR`` set, each worker writes its counters there and
+    ``/metrics`` sums all workers; otherwise it reports this process only.
+    The directory is looked up on first use, as gunicorn only sets it once
+    a preloaded app has been created (see gunicorn_config.py).
+    """
+    app.config.setdefault('METRICS_DIR', None)
+    stores = {}
+
+    def snapshot_store():
+        pid = os.getpid()
+        if pid not in stores:
+            directory = app.config['METRICS_DIR'] or os.environ.get('METRICS_DIR')
+            stores[pid] = SnapshotStore(directory) if directory else None
+            if stores[pid] is not None:
+                atexit.register(stores[pid].flush)
+        return stores[pid]
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    def template_started(sender, template, context, **extra):
+        if has_request_context():
+            g.setdefault('template_starts', []).append(time.perf_counter())
+
+    def template_finished(sender, template, context, **extra):
+        if not has_request_context() or not g.get('template_starts'):
+            return
+        elapsed = time.perf_counter() - g.template_starts.pop()
+        registry.observe('fee_manager_template_render_seconds', (template.name or 'string',), elapsed)
+        # Only count the outermost render; includes are part of it
+        if not g.template_starts:
+            g.template_time = g.get('template_time', 0.0) + elapsed
+
+    # Receivers are local functions, so keep strong references to them
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        # Route name, not path, so ids and cursors don't explode the label set
+        endpoint = request.endpoint or 'unmatched'
+        sql_count = get_query_count()
+        sql_time = get_query_time()
+
+        registry.inc('fee_manager_http_requests_total',
+                     (endpoint, request.method, str(response.status_code)))
+        registry.observe('fee_manager_http_request_duration_seconds', (endpoint, request.method), duration)
+        registry.inc('fee_manager_sql_statements_total', (endpoint,), sql_count)
+        registry.observe('fee_manager_sql_statements_per_request', (endpoint,), sql_count)
+        registry.observe('fee_manager_sql_duration_seconds', (endpoint,), sql_time)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'sql_count': sql_count,
+            'sql_ms': round(sql_time * 1000, 1),
+            'template_ms': round(g.get('template_time', 0.0) * 1000, 1),
+            'report_ms': round(g.get('report_time', 0.0) * 1000, 1),
+        }
+        request_logger.info(' '.join(f'{key}={value}' for key, value in fields.items()),
+                            extra={'request_metrics': fields})
+
+        store = snapshot_store()
+        if store is not None:
+            store.mark_dirty()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        store = snapshot_store()
+        samples = store.collect() if store is not None else merge_snapshots([registry.snapshot()])
+        return Response(render_text(registry.families, samples),
+                        mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,133 @@
+from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+def insert_ignoring_duplicates(model):
+    """INSERT that skips rows violating a unique constraint
+    (ON CONFLICT DO NOTHING / INSERT OR IGNORE)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(model).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(model).on_conflict_do_nothing()
+    return db.insert(model)
+
+class Student(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    seat_number = db.Column(db.String(20), unique=True, nullable=False)
+    phone_number = db.Column(db.String(15))
+    joining_date = db.Column(db.Date, nullable=False)
+    monthly_fee = db.Column(db.Float, nullable=False)
+    # Live fees only; fee_storage.fee_history() also reads the archive.
+    # Never loaded implicitly: queries that need it say so with
+    # selectinload()/contains_eager(), so an N+1 access raises instead.
+    # delete_student removes the fees itself, hence passive_deletes.
+    fees = db.relationship('Fee', back_populates='student', lazy='raise_on_sql',
+                           order_by='Fee.month.desc()', passive_deletes=True)
+
+    __table_args__ = (
+        # Keyset pagination of the student list
+        db.Index('ix_student_name_id', 'name', 'id'),
+    )
+
+class Fee(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    month = db.Column(db.Date, nullable=False)
+    paid = db.Column(db.Boolean, default=False)
+    payment_date = db.Column(db.Date)
+    # Load with joinedload()/contains_eager(); see Student.fees
+    student = db.relationship('Student', back_populates='fees', lazy='raise_on_sql')
+
+    __table_args__ = (
+        # One fee per student per month; also serves per-student lookups
+        db.Index('uq_fee_student_month', 'student_id', 'month', unique=True),
+        # Unpaid lists and current-month dues
+        db.Index('ix_fee_paid_month', 'paid', 'month'),
+        # Recent payments and monthly collection
+        db.Index('ix_fee_paid_payment_date', 'paid', 'payment_date'),
+        # Monthly report
+        db.Index('ix_fee_month', 'month'),
+    )
+
+class FeeArchive(db.Model):
+    """Fees of closed, fully paid months moved out of the fee table by
+    'flask archive-fees'. Every archived fee was paid, so there is no
+    ``paid`` column; read both tables through ``fee_storage.fee_history``."""
+    __tablename__ = 'fee_archive'
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    # The fee's id in the live table, kept for reports and exports
+    id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    payment_date = db.Column(db.Date)
+
+    __table_args__ = (
+        # Monthly report and export of an archived month
+        db.Index('ix_fee_archive_month', 'month'),
+        # Clustered by (student_id, month) on SQLite: a student's history is
+        # one range read
+        {'sqlite_with_rowid': False},
+    )
+
+class FeeGenerationLedger(db.Model):
+    """One row per billing month whose fees have been generated for all students"""
+    month = db.Column(db.Date, primary_key=True)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    fee_count = db.Column(db.Integer, nullable=False, default=0)
+
+class MonthlyRollup(db.Model):
+    """Fee totals per month, maintained incrementally by every fee write
+    (see rollups.py); rebuild with 'flask rebuild-rollups'"""
+    month = db.Column(db.Date, primary_key=True)
+    billed_amount = db.Column(db.Float, nullable=False, default=0)
+    collected_amount = db.Column(db.Float, nullable=False, default=0)
+    outstanding_amount = db.Column(db.Float, nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    unpaid_count = db.Column(db.Integer, nullable=False, default=0)
+    # Payments dated in this month, whichever month they were billed for
+    received_amount = db.Column(db.Float, nullable=False, default=0)
+
+class ReportJob(db.Model):
+    """Background report render; the id is the report key plus its data
+    version, so resubmitting unchanged data finds the same job"""
+    id = db.Column(db.String(64), primary_key=True)
+    report_key = db.Column(db.String(32), nullable=False)
+    version = db.Column(db.String(16), nullable=False)
+    download_name = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+class DataVersion(db.Model):
+    """Single-row counter bumped by every transaction that writes students,
+    fees or the rollup, plus a row holding the database's random generation
+    stamp; page ETags and dashboard fragments are keyed by both (see
+    http_cache.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ReminderLog(db.Model):
+    """One row per fee a due reminder was sent (or is being sent) for; the
+    primary key keeps a fee from being messaged twice. No foreign key, as
+    the fee may later be archived or live in a partitioned table."""
+    fee_id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    # The dispatch run that claimed the row
+    run_id = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    # Gateway attempts in the last run
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    claimed_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_reminder_log_run_id', 'run_id'),
+    )
@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+PAGE_SIZE = 50
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of rows plus the cursor that continues after its last row"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('cursor does not match sort key')
+        return [_from_json(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def _after(columns, values, descending):
+    """WHERE clause selecting rows strictly after ``values`` in sort order:
+    (a > x) OR (a = x AND b > y) OR ..."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, key, cursor=None, per_page=PAGE_SIZE, descending=False):
+    """Return one ``KeysetPage`` of ``query`` ordered by ``columns``.
+
+    ``columns`` must end in a unique column so the order is total, and
+    ``key(row)`` must return the values of ``columns`` for a result row.
+    An invalid cursor raises ``InvalidCursor``.
+    """
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns), descending))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(key(rows[-1]))
+    return KeysetPage(rows, next_cursor)
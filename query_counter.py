@@ -0,0 +1,57 @@
+import time
+import logging
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('fee_manager')
+
+DEFAULT_THRESHOLD = 20
+
+
+def get_query_count():
+    """Number of SQL statements executed so far in the current request"""
+    return g.get('sql_query_count', 0)
+
+
+def get_query_time():
+    """Seconds spent executing SQL so far in the current request"""
+    return g.get('sql_query_time', 0.0)
+
+
+def init_query_counter(app, db):
+    """Count and time SQL statements per request and warn about chatty requests.
+
+    Statements are always counted; the warning is logged when the app runs
+    in debug mode or ``SQL_QUERY_WARN`` is set, and a request executes more
+    than ``SQL_QUERY_WARN_THRESHOLD`` statements.
+    """
+    app.config.setdefault('SQL_QUERY_WARN', False)
+    app.config.setdefault('SQL_QUERY_WARN_THRESHOLD', DEFAULT_THRESHOLD)
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.sql_query_count = g.get('sql_query_count', 0) + 1
+            # Statements on one connection run one at a time, so a single
+            # slot is enough; a failed statement's start is simply overwritten
+            conn.info['query_start'] = time.perf_counter()
+
+    def time_statement(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('query_start', None)
+        if start is not None and has_request_context():
+            g.sql_query_time = g.get('sql_query_time', 0.0) + time.perf_counter() - start
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        event.listen(db.engine, 'after_cursor_execute', time_statement)
+
+    @app.after_request
+    def warn_on_query_count(response):
+        if app.debug or app.config['SQL_QUERY_WARN']:
+            count = get_query_count()
+            threshold = app.config['SQL_QUERY_WARN_THRESHOLD']
+            if count > threshold:
+                logger.warning(
+                    f'{request.method} {request.path} executed {count} SQL statements '
+                    f'(threshold {threshold})'
+                )
+        return response
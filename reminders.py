@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import importlib
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
+from sqlalchemy import and_, or_
+from models import db, insert_ignoring_duplicates, Student, Fee, ReminderLog
+
+logger = logging.getLogger('fee_manager')
+
+# Gateway calls in flight at once, and the most started per second
+REMINDER_CONCURRENCY = int(os.environ.get('REMINDER_CONCURRENCY', 8))
+REMINDER_RATE = float(os.environ.get('REMINDER_RATE', 10))
+REMINDER_MAX_ATTEMPTS = int(os.environ.get('REMINDER_MAX_ATTEMPTS', 3))
+REMINDER_BACKOFF_SECONDS = float(os.environ.get('REMINDER_BACKOFF_SECONDS', 1))
+# A claim left pending this long belongs to a run that died; reclaim it
+REMINDER_STALE_CLAIM = timedelta(minutes=int(os.environ.get('REMINDER_STALE_MINUTES', 60)))
+# Rows per claim or status statement
+BATCH_SIZE = 500
+
+
+class GatewayError(Exception):
+    """A message was not accepted; ``retryable`` for timeouts, throttling
+    and server errors"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class StubGateway:
+    """Gateway for development and tests: keeps messages in ``sent`` and,
+    if ``outbox`` is set, appends them to that file as JSON lines.
+    ``latency`` and ``failure_rate`` simulate a slow or flaky provider."""
+
+    def __init__(self, outbox=None, latency=0.0, failure_rate=0.0):
+        self.outbox = outbox
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, phone_number, body):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise GatewayError('Simulated gateway failure')
+        with self._lock:
+            self.sent.append((phone_number, body))
+            if self.outbox:
+                with open(self.outbox, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'to': phone_number, 'body': body,
+                                        'at': datetime.now().isoformat()}) + '\n')
+
+
+class WebhookGateway:
+    """POSTs ``{"to": ..., "body": ...}`` as JSON to an SMS/WhatsApp
+    provider or relay"""
+
+    def __init__(self, url, token=None, timeout=10):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, phone_number, body):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'to': phone_number, 'body': body}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        if self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise GatewayError(f'Gateway returned HTTP {e.code}',
+                               retryable=e.code == 429 or e.code >= 500)
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise GatewayError(f'Gateway unreachable: {e}')
+
+
+def gateway_from_env(env=os.environ):
+    """Gateway named by REMINDER_GATEWAY: 'stub' (default), 'webhook'
+    (REMINDER_WEBHOOK_URL, REMINDER_WEBHOOK_TOKEN) or 'module:Class' for a
+    custom class with a ``send(phone_number, body)`` method"""
+    kind = env.get('REMINDER_GATEWAY', 'stub')
+    if kind == 'stub':
+        return StubGateway(outbox=env.get('REMINDER_STUB_OUTBOX'))
+    if kind == 'webhook':
+        url = env.get('REMINDER_WEBHOOK_URL')
+        if not url:
+            raise ValueError('REMINDER_WEBHOOK_URL is required for the webhook gateway')
+        return WebhookGateway(url, env.get('REMINDER_WEBHOOK_TOKEN'))
+    module_name, _, class_name = kind.partition(':')
+    if not class_name:
+        raise ValueError(f'Unknown reminder gateway: {kind}')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class RateLimiter:
+    """Token bucket shared by the sender threads"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def send_with_retry(gateway, limiter, phone_number, body,
+                    attempts=REMINDER_MAX_ATTEMPTS, backoff=REMINDER_BACKOFF_SECONDS):
+    """Send one message, retrying retryable failures with exponential
+    backoff and jitter. Returns (attempts made, error or None)."""
+    for attempt in range(1, attempts + 1):
+        limiter.acquire()
+        try:
+            gateway.send(phone_number, body)
+            return attempt, None
+        except GatewayError as e:
+            if not e.retryable or attempt == attempts:
+                return attempt, str(e)
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+        except Exception as e:
+            logger.error(f'Reminder gateway error: {str(e)}', exc_info=True)
+            return attempt, str(e)
+
+
+def due_reminders(today=None, stale_before=None):
+    """Unpaid fees up to the current month whose student has a phone number
+    and who has not been reminded of them yet, in one query. Rows are
+    (fee_id, month, amount, student_id, name, seat_number, phone_number,
+    log_status)."""
+    today = today or date.today()
+    current_month = today.replace(day=1)
+    stale_before = stale_before or datetime.now() - REMINDER_STALE_CLAIM
+    return db.session.query(
+            Fee.id.label('fee_id'), Fee.month, Fee.amount,
+            Student.id.label('student_id'), Student.name, Student.seat_number, Student.phone_number,
+            ReminderLog.status.label('log_status')
+        )\
+        .join(Student, Fee.student_id == Student.id)\
+        .outerjoin(ReminderLog, ReminderLog.fee_id == Fee.id)\
+        .filter(
+            Fee.paid == False,
+            Fee.month <= current_month,
+            Student.phone_number != None,
+            Student.phone_number != '',
+            or_(
+                ReminderLog.fee_id == None,
+                ReminderLog.status == 'failed',
+                and_(ReminderLog.status == 'pending', ReminderLog.claimed_at < stale_before)
+            )
+        )\
+        .order_by(Student.id, Fee.month)\
+        .all()
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def claim(rows, run_id, stale_before):
+    """Mark ``rows`` as pending for ``run_id`` and return the fee ids this run
+    won. A concurrent run (another worker or a cron job) that selected the
+    same fees loses them here and skips them."""
+    now = datetime.now()
+    new = [row for row in rows if row.log_status is None]
+    retry = [row.fee_id for row in rows if row.log_status is not None]
+    for batch in _batches(new):
+        db.session.execute(insert_ignoring_duplicates(ReminderLog), [
+            {'fee_id': row.fee_id, 'student_id': row.student_id, 'run_id': run_id,
+             'status': 'pending', 'attempts': 0, 'claimed_at': now}
+            for row in batch
+        ])
+    for batch in _batches(retry):
+        db.session.execute(
+            db.update(ReminderLog)
+                .where(ReminderLog.fee_id.in_(batch), or_(
+                    ReminderLog.status == 'failed',
+                    and_(ReminderLog.status == 'pending', ReminderLog.claimed_at < stale_before)
+                ))
+                .values(run_id=run_id, status='pending', error=None, claimed_at=now)
+        )
+    db.session.commit()
+    return set(db.session.execute(
+        db.select(ReminderLog.fee_id).where(ReminderLog.run_id == run_id,
+                                            ReminderLog.status == 'pending')
+    ).scalars())
+
+
+def reminder_text(name, seat_number, fees):
+    """Message body for one student's unpaid ``(month, amount)`` fees"""
+    total = sum(amount for _, amount in fees)
+    months = ', '.join(month.strftime('%B %Y') for month, _ in fees)
+    return (f'Dear {name} (Seat No: {seat_number}), your fee of Rs. {total:.2f} '
+            f'for {months} is due. Please pay at the earliest.')
+
+
+def dispatch_reminders(gateway=None, concurrency=REMINDER_CONCURRENCY, rate=REMINDER_RATE,
+                       dry_run=False, today=None):
+    """Send one message per student covering all of their unreminded unpaid
+    fees; call within an app context.
+
+    Sends run on a thread pool behind a shared rate limit and never touch
+    the database; this thread claims fees up front and records outcomes in
+    batches. Returns a dict of counts.
+    """
+    gateway = gateway or gateway_from_env()
+    stale_before = datetime.now() - REMINDER_STALE_CLAIM
+    rows = due_reminders(today, stale_before)
+    if dry_run:
+        return {'students': len({row.student_id for row in rows}), 'fees': len(rows),
+                'sent': 0, 'failed': 0, 'skipped': 0}
+
+    run_id = uuid.uuid4().hex
+    claimed = claim(rows, run_id, stale_before) if rows else set()
+
+    messages = OrderedDict()
+    for fee_id, month, amount, student_id, name, seat_number, phone_number, _ in rows:
+        if fee_id in claimed:
+            message = messages.setdefault(student_id, {
+                'phone_number': phone_number.strip(), 'name': name,
+                'seat_number': seat_number, 'fees': [], 'fee_ids': []
+            })
+            message['fees'].append((month, amount))
+            message['fee_ids'].append(fee_id)
+
+    counts = {'students': len(messages), 'fees': len(claimed),
+              'sent': 0, 'failed': 0, 'skipped': len(rows) - len(claimed)}
+    limiter = RateLimiter(rate)
+    pending_updates = []
+
+    def record():
+        if pending_updates:
+            db.session.execute(db.update(ReminderLog), pending_updates)
+            db.session.commit()
+            del pending_updates[:]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reminder') as pool:
+        futures = {
+            pool.submit(send_with_retry, gateway, limiter, message['phone_number'],
+                        reminder_text(message['name'], message['seat_number'], message['fees'])): message
+            for message in messages.values()
+        }
+        for future in as_completed(futures):
+            message = futures[future]
+            attempts, error = future.result()
+            status = 'failed' if error else 'sent'
+            counts[status] += 1
+            if error:
+                logger.warning(f'Reminder to seat {message["seat_number"]} failed after '
+                               f'{attempts} attempt(s): {error}')
+            pending_updates.extend(
+                {'fee_id': fee_id, 'status': status, 'attempts': attempts, 'error': error,
+                 'sent_at': None if error else datetime.now()}
+                for fee_id in message['fee_ids']
+            )
+            if len(pending_updates) >= BATCH_SIZE:
+                record()
+    record()
+
+    logger.info(f'Reminder run {run_id}: {counts["sent"]} sent, {counts["failed"]} failed, '
+                f'{counts["skipped"]} fee(s) claimed by another run, '
+                f'{time.perf_counter() - start:.1f}s')
+    return counts
+
+
+class ReminderRunner:
+    """Runs ``dispatch_reminders`` on a background thread, one run at a time
+    per process, so a request can start a run without waiting for it"""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Start a run unless one is in progress; returns whether it started"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name='reminder-dispatch', daemon=True)
+            self._thread.start()
+            return True
+
+    @staticmethod
+    def _run(app):
+        with app.app_context():
+            try:
+                dispatch_reminders()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f'Reminder run failed: {str(e)}', exc_info=True)
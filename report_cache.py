@@ -0,0 +1,147 @@
+import os
+import io
+import time
+import hashlib
+import logging
+from urllib.parse import quote
+from flask import send_file, make_response
+
+logger = logging.getLogger('fee_manager')
+
+# Bump when the PDF layout changes so cached reports are re-rendered
+REPORT_FORMAT_VERSION = 2
+
+
+def data_version(*rows):
+    """Short digest of the values a report is rendered from.
+
+    Any change to a student or fee row shown in the report (amount, paid
+    flag, payment date, name, ...) yields a different version.
+    """
+    digest = hashlib.sha1(str(REPORT_FORMAT_VERSION).encode())
+    for row in rows:
+        digest.update(repr(row).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class ReportCache:
+    """Rendered PDFs on disk, keyed by report and data version.
+
+    Files are named ``<key>_<version>.pdf``; writing a new version removes
+    older versions of the same key. The directory is kept under
+    ``max_bytes`` and files unused for ``max_age`` seconds are dropped.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, max_age=7 * 24 * 3600,
+                 x_accel_prefix=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # URL prefix of an nginx 'internal' location serving ``directory``
+        self.x_accel_prefix = x_accel_prefix
+
+    def filename(self, key, version):
+        return f'{key}_{version}.pdf'
+
+    def get(self, key, version):
+        """Path of the cached report, or None on a miss"""
+        path = os.path.join(self.directory, self.filename(key, version))
+        try:
+            # Refresh mtime so eviction drops the least recently served first
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, version, data):
+        """Store rendered report bytes atomically and return the path"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = self.filename(key, version)
+        path = os.path.join(self.directory, name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        # Older versions of this report can never be served again
+        prefix = f'{key}_'
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefix) and entry.name.endswith('.pdf') and entry.name != name:
+                self._remove(entry.path)
+
+        self.evict()
+        return path
+
+    def evict(self):
+        """Drop expired files, then the oldest until under the size bound"""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file()]
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        files = []
+        removed = 0
+        for entry in entries:
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age:
+                removed += self._remove(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+
+        if removed:
+            logger.info(f'Evicted {removed} cached report(s) from {self.directory}')
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def send_cached(self, key, version, download_name):
+        """Response for a cached report, or None if it is not in the cache"""
+        path = self.get(key, version)
+        if path is None:
+            return None
+        logger.info(f'Serving cached report {os.path.basename(path)}')
+        return self._send_path(path, download_name)
+
+    def serve(self, key, version, render, download_name):
+        """Response for a report, rendering it with ``render(buffer)`` on a miss"""
+        response = self.send_cached(key, version, download_name)
+        if response is not None:
+            return response
+
+        buffer = io.BytesIO()
+        render(buffer)
+        data = buffer.getvalue()
+        try:
+            self.put(key, version, data)
+        except OSError as e:
+            logger.warning(f'Could not cache report {key}: {str(e)}')
+        return send_file(io.BytesIO(data), mimetype='application/pdf',
+                         as_attachment=True, download_name=download_name)
+
+    def _send_path(self, path, download_name):
+        if self.x_accel_prefix:
+            # Let nginx stream the file from its internal /reports/ location
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = f'{self.x_accel_prefix.rstrip("/")}/{os.path.basename(path)}'
+            response.headers['Content-Type'] = 'application/pdf'
+            ascii_name = download_name.encode('ascii', 'ignore').decode().replace('"', '')
+            response.headers['Content-Disposition'] = (
+                f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(download_name)}'
+            )
+            return response
+        return send_file(path, mimetype='application/pdf',
+                         as_attachment=True, download_name=download_name)
@@ -5,19 +5,185 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from datetime import datetime
 
+# Styles are immutable once built, so they are shared by every report
+# rendered in this process
+styles = getSampleStyleSheet()
+
+title_style = ParagraphStyle(
+    'CustomTitle',
+    parent=styles['Heading1'],
+    fontSize=24,
+    spaceAfter=30
+)
+
+details_table_style = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _fee_table_style(amount_column):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('ALIGN', (amount_column, 1), (amount_column, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10)
+    ])
+
+
+student_fee_table_style = _fee_table_style(1)
+monthly_fee_table_style = _fee_table_style(2)
+
+STUDENT_FEE_HEADER = ['Month', 'Amount', 'Status', 'Payment Date']
+STUDENT_FEE_COL_WIDTHS = [2*inch, 1.5*inch, 1.5*inch, 1.5*inch]
+MONTHLY_FEE_HEADER = ['Student Name', 'Seat No.', 'Amount', 'Status', 'Payment Date']
+MONTHLY_FEE_COL_WIDTHS = [2*inch, 1*inch, 1.5*inch, 1*inch, 1.5*inch]
+
+
+class LazyFlowables:
+    """List-like sequence of flowables for ``doc.build()`` that pulls items
+    from a generator only as the layout engine reaches them.
+
+    ``count`` is the exact number of items ``generator`` yields. Only the
+    flowables for the page being laid out are alive at any time, so memory
+    is bounded by page size rather than report size.
+    """
+
+    def __init__(self, head, generator, count):
+        self._items = list(head)
+        self._pending = generator
+        self._remaining = count
+
+    def __len__(self):
+        return len(self._items) + self._remaining
+
+    def _fill(self, n):
+        while len(self._items) < n and self._remaining:
+            self._items.append(next(self._pending))
+            self._remaining -= 1
+
+    def _end(self, key):
+        if isinstance(key, slice):
+            stop = len(self) if key.stop is None else key.stop
+        else:
+            stop = key + 1
+        return stop if stop >= 0 else len(self) + stop
+
+    def __getitem__(self, key):
+        self._fill(self._end(key))
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        self._fill(self._end(key))
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        self._fill(self._end(key))
+        del self._items[key]
+
+    def insert(self, index, value):
+        self._fill(index)
+        self._items.insert(index, value)
+
+
+def _frame_height(doc):
+    # SimpleDocTemplate's frame pads each edge by 6pt
+    return doc.height - 12
+
+
+def _height_used(doc, flowables):
+    """Height the flowables take at the top of the first page"""
+    used = 0
+    for flowable in flowables:
+        used += flowable.wrap(doc.width, doc.height)[1]
+        used += flowable.getSpaceBefore() + flowable.getSpaceAfter()
+    return used
+
+
+def _chunk_sizes(doc, head, header, col_widths, table_style, sample_row):
+    """Rows in the first chunk, below ``head`` on page one, and in each
+    later chunk, so that every chunk fills exactly one page and no table
+    ever splits. Fee cells are single lines, so rows have a fixed height."""
+    sample = Table([header, sample_row], colWidths=col_widths)
+    sample.setStyle(table_style)
+    sample.wrap(doc.width, doc.height)
+    header_height, row_height = sample._rowHeights
+    per_page = max(1, int((_frame_height(doc) - header_height) // row_height))
+    first = int((_frame_height(doc) - _height_used(doc, head) - header_height) // row_height)
+    # Too little room left on page one: the table starts on page two
+    return min(max(first, 0), per_page) or per_page, per_page
+
+
+def _chunk_bounds(count, first, per_page):
+    bounds = [(0, min(first, count))]
+    for start in range(first, count, per_page):
+        bounds.append((start, min(start + per_page, count)))
+    return bounds
+
+
+def _fee_table_chunks(doc, head, rows, header, col_widths, table_style, format_row):
+    """(number of chunks, generator of page-sized Tables with their own
+    header row) for ``rows``"""
+    first, per_page = _chunk_sizes(doc, head, header, col_widths, table_style, format_row(rows[0]))
+    bounds = _chunk_bounds(len(rows), first, per_page)
+
+    def tables():
+        for start, stop in bounds:
+            data = [header]
+            data.extend(format_row(row) for row in rows[start:stop])
+            table = Table(data, colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            yield table
+
+    return len(bounds), tables()
+
+
+def _format_student_fee(fee):
+    status = 'Paid' if fee.paid else 'Unpaid'
+    payment_date = fee.payment_date.strftime('%Y-%m-%d') if fee.payment_date else '-'
+    return [
+        fee.month.strftime('%B %Y'),
+        f'₹{fee.amount:.2f}',
+        status,
+        payment_date
+    ]
+
+
+def _format_monthly_fee(row):
+    fee, student = row
+    status = 'Paid' if fee.paid else 'Unpaid'
+    payment_date = fee.payment_date.strftime('%Y-%m-%d') if fee.payment_date else '-'
+    return [
+        student.name,
+        student.seat_number,
+        f'₹{fee.amount:.2f}',
+        status,
+        payment_date
+    ]
+
+
 def generate_student_report(student, fees, filename):
-    """Generate a PDF report for a student's fee details"""
+    """Generate a PDF report for a student's fee details into a filename or file-like object"""
     doc = SimpleDocTemplate(filename, pagesize=letter)
-    styles = getSampleStyleSheet()
     elements = []
 
     # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30
-    )
     elements.append(Paragraph('Student Fee Report', title_style))
     elements.append(Spacer(1, 20))
 
@@ -30,82 +196,57 @@ def generate_student_report(student, fees, filename):
         ['Joining Date:', student.joining_date.strftime('%Y-%m-%d')],
         ['Monthly Fee:', f'₹{student.monthly_fee:.2f}']
     ]
-    
+
     student_table = Table(student_details, colWidths=[2*inch, 4*inch])
-    student_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    student_table.setStyle(details_table_style)
     elements.append(student_table)
     elements.append(Spacer(1, 20))
 
     # Fee Records
-    if fees:
-        fee_data = [['Month', 'Amount', 'Status', 'Payment Date']]
-        for fee in fees:
-            status = 'Paid' if fee.paid else 'Unpaid'
-            payment_date = fee.payment_date.strftime('%Y-%m-%d') if fee.payment_date else '-'
-            fee_data.append([
-                fee.month.strftime('%B %Y'),
-                f'₹{fee.amount:.2f}',
-                status,
-                payment_date
-            ])
-        
-        fee_table = Table(fee_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        fee_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10)
-        ]))
-        elements.append(Paragraph('Fee Records', styles['Heading2']))
-        elements.append(fee_table)
-    else:
+    if not fees:
         elements.append(Paragraph('No fee records found.', styles['Normal']))
+        doc.build(elements)
+        return filename
 
-    doc.build(elements)
+    elements.append(Paragraph('Fee Records', styles['Heading2']))
+    count, chunks = _fee_table_chunks(doc, elements, fees, STUDENT_FEE_HEADER, STUDENT_FEE_COL_WIDTHS,
+                                      student_fee_table_style, _format_student_fee)
+    doc.build(LazyFlowables(elements, chunks, count))
     return filename
 
-def generate_monthly_report(fees_data, target_date, filename):
-    """Generate a PDF report for all fees in a specific month"""
+
+def generate_monthly_report(fees_data, target_date, filename, summary=None):
+    """Generate a PDF report for all fees in a specific month into a filename or file-like object.
+
+    ``summary`` may carry precomputed totals (total_amount, paid_amount,
+    unpaid_amount, paid_count, unpaid_count); otherwise they are computed
+    from ``fees_data``.
+    """
     doc = SimpleDocTemplate(filename, pagesize=letter)
-    styles = getSampleStyleSheet()
     elements = []
 
     # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30
-    )
     title = f'Monthly Fee Report - {target_date.strftime("%B %Y")}'
     elements.append(Paragraph(title, title_style))
     elements.append(Spacer(1, 20))
 
-    # Summary
-    total_amount = sum(fee.amount for fee, _ in fees_data)
-    paid_amount = sum(fee.amount for fee, _ in fees_data if fee.paid)
-    unpaid_amount = total_amount - paid_amount
-    paid_count = sum(1 for fee, _ in fees_data if fee.paid)
-    unpaid_count = len(fees_data) - paid_count
+    # Summary, in a single pass over the rows unless provided
+    if summary is None:
+        total_amount = paid_amount = 0
+        paid_count = 0
+        for fee, _ in fees_data:
+            total_amount += fee.amount
+            if fee.paid:
+                paid_amount += fee.amount
+                paid_count += 1
+        unpaid_amount = total_amount - paid_amount
+        unpaid_count = len(fees_data) - paid_count
+    else:
+        total_amount = summary['total_amount']
+        paid_amount = summary['paid_amount']
+        unpaid_amount = summary['unpaid_amount']
+        paid_count = summary['paid_count']
+        unpaid_count = summary['unpaid_count']
 
     summary_data = [
         ['Summary', ''],
@@ -118,54 +259,18 @@ def generate_monthly_report(fees_data, target_date, filename):
     ]
 
     summary_table = Table(summary_data, colWidths=[2*inch, 4*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    summary_table.setStyle(details_table_style)
     elements.append(summary_table)
     elements.append(Spacer(1, 20))
 
     # Fee Records
-    if fees_data:
-        fee_data = [['Student Name', 'Seat No.', 'Amount', 'Status', 'Payment Date']]
-        for fee, student in fees_data:
-            status = 'Paid' if fee.paid else 'Unpaid'
-            payment_date = fee.payment_date.strftime('%Y-%m-%d') if fee.payment_date else '-'
-            fee_data.append([
-                student.name,
-                student.seat_number,
-                f'₹{fee.amount:.2f}',
-                status,
-                payment_date
-            ])
-        
-        fee_table = Table(fee_data, colWidths=[2*inch, 1*inch, 1.5*inch, 1*inch, 1.5*inch])
-        fee_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10)
-        ]))
-        elements.append(Paragraph('Fee Records', styles['Heading2']))
-        elements.append(fee_table)
-    else:
+    if not fees_data:
         elements.append(Paragraph('No fee records found.', styles['Normal']))
+        doc.build(elements)
+        return filename
 
-    doc.build(elements)
+    elements.append(Paragraph('Fee Records', styles['Heading2']))
+    count, chunks = _fee_table_chunks(doc, elements, fees_data, MONTHLY_FEE_HEADER, MONTHLY_FEE_COL_WIDTHS,
+                                      monthly_fee_table_style, _format_monthly_fee)
+    doc.build(LazyFlowables(elements, chunks, count))
     return filename
@@ -0,0 +1,74 @@
+import io
+import os
+import logging
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('fee_manager')
+
+# Attribute views of plain SQL rows, so report_generator can render them
+# in a worker process without ORM objects or a database session
+FeeRow = namedtuple('FeeRow', ['amount', 'paid', 'payment_date'])
+StudentRow = namedtuple('StudentRow', ['name', 'seat_number'])
+
+
+def render_monthly_report(rows, target_date, summary=None):
+    """Render a monthly report from (fee_id, amount, paid, payment_date,
+    name, seat_number) tuples and return the PDF bytes.
+
+    Runs in a pool process.
+    """
+    from report_generator import generate_monthly_report
+
+    fees_data = [
+        (FeeRow(amount, paid, payment_date), StudentRow(name, seat_number))
+        for _, amount, paid, payment_date, name, seat_number in rows
+    ]
+    buffer = io.BytesIO()
+    generate_monthly_report(fees_data, target_date, buffer, summary)
+    return buffer.getvalue()
+
+
+class ReportWorkerPool:
+    """Process pool for rendering reports outside the web worker threads.
+
+    The pool is created on first use. It uses the 'spawn' start method so
+    children never inherit the web worker's threads or open DB connections.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, min(2, os.cpu_count() or 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f'Started report worker pool with {self.max_workers} process(es)')
+            return self._executor
+
+    def submit(self, fn, *args, on_done=None):
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A child died (e.g. OOM-killed); start a fresh pool and retry once
+            logger.warning('Report worker pool is broken, restarting it')
+            self.shutdown(wait=False)
+            future = self.executor.submit(fn, *args)
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
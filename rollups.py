@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+# Per-month aggregates kept in the monthly_rollup table. The first five are
+# keyed by billing month (Fee.month); received_amount is keyed by the month
+# of Fee.payment_date, i.e. the cash actually collected in that month.
+ROLLUP_FIELDS = (
+    'billed_amount',
+    'collected_amount',
+    'outstanding_amount',
+    'paid_count',
+    'unpaid_count',
+    'received_amount',
+)
+
+
+def fee_state(fee):
+    """(month, amount, paid, payment_date) of a Fee, or None for no fee"""
+    if fee is None:
+        return None
+    return (fee.month, fee.amount, bool(fee.paid), fee.payment_date)
+
+
+def add_contribution(deltas, state, sign=1):
+    """Add (sign=1) or remove (sign=-1) one fee's contribution to ``deltas``,
+    a ``{month: {field: value}}`` mapping"""
+    if state is None:
+        return deltas
+    month, amount, paid, payment_date = state
+    billing = deltas[month.replace(day=1)]
+    billing['billed_amount'] += sign * amount
+    if paid:
+        billing['collected_amount'] += sign * amount
+        billing['paid_count'] += sign
+        if payment_date is not None:
+            deltas[payment_date.replace(day=1)]['received_amount'] += sign * amount
+    else:
+        billing['outstanding_amount'] += sign * amount
+        billing['unpaid_count'] += sign
+    return deltas
+
+
+def new_deltas():
+    return defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+
+
+def fee_delta(old_state, new_state, deltas=None):
+    """Rollup changes caused by a fee going from ``old_state`` to
+    ``new_state`` (either may be None for an insert or delete)"""
+    deltas = new_deltas() if deltas is None else deltas
+    add_contribution(deltas, old_state, sign=-1)
+    add_contribution(deltas, new_state, sign=1)
+    return deltas
+
+
+def nonzero(deltas):
+    """Drop months whose deltas all cancel out"""
+    return {
+        month: fields
+        for month, fields in deltas.items()
+        if any(fields[field] for field in ROLLUP_FIELDS)
+    }
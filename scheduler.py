@@ -0,0 +1,50 @@
+import threading
+import logging
+from datetime import datetime, date
+from dateutil.relativedelta import relativedelta
+
+logger = logging.getLogger('fee_manager')
+
+# Upper bound on a single sleep so suspended hosts and clock changes are
+# picked up within the hour instead of after a full month.
+MAX_SLEEP_SECONDS = 3600
+
+
+def seconds_until_next_month(now=None):
+    """Seconds from ``now`` until midnight on the first of next month"""
+    now = now or datetime.now()
+    next_month = date(now.year, now.month, 1) + relativedelta(months=1)
+    rollover = datetime(next_month.year, next_month.month, 1)
+    return max((rollover - now).total_seconds(), 0)
+
+
+class MonthlyScheduler(threading.Thread):
+    """Daemon thread that runs ``job`` on start and again at every month rollover"""
+
+    def __init__(self, job, name='fee-scheduler'):
+        super().__init__(name=name, daemon=True)
+        self.job = job
+        self._stop_event = threading.Event()
+        self._last_month = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_pending(self):
+        today = datetime.now().date()
+        current_month = (today.year, today.month)
+        if current_month == self._last_month:
+            return False
+        try:
+            self.job()
+            self._last_month = current_month
+        except Exception as e:
+            logger.error(f'Scheduled job {self.name} failed: {str(e)}', exc_info=True)
+        return True
+
+    def run(self):
+        logger.info(f'Scheduler {self.name} started')
+        while not self._stop_event.is_set():
+            self.run_pending()
+            wait = min(seconds_until_next_month() + 1, MAX_SLEEP_SECONDS)
+            self._stop_event.wait(wait)
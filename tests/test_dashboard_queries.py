@@ -0,0 +1,20 @@
+"""The dashboard's SQL statement budget (see benchmarks/dashboard_queries.py)"""
+import pytest
+
+from benchmarks.dashboard_queries import DASHBOARD_QUERY_BUDGET, dashboard_query_counts, make_app
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOG_DIR', str(tmp_path / 'logs'))
+    return make_app(str(tmp_path))
+
+
+def test_dashboard_query_count_is_fixed(app):
+    counts = dashboard_query_counts(app, sizes=(10, 200))
+    assert len(set(counts.values())) == 1, f'query count grows with the roster: {counts}'
+
+
+def test_dashboard_stays_within_query_budget(app):
+    counts = dashboard_query_counts(app, sizes=(50,))
+    assert counts[50] <= DASHBOARD_QUERY_BUDGET